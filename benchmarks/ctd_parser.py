@@ -0,0 +1,114 @@
+"""Compare the old file-based CTD reader against the buffer-based CTDDecompile.
+
+Usage: python -m benchmarks.ctd_parser <folder_with_ctd_files> [iterations]
+"""
+
+import sys
+import timeit
+import unicodedata
+from pathlib import Path
+
+from kingdomheartstools.tools.ctd_decompile import CTDDecompile
+
+
+def legacy_parse(path):
+    """Message texts as the previous reader produced them (one read per field/char)."""
+    texts = []
+
+    def read_int(f, size):
+        return int.from_bytes(f.read(size), "little")
+
+    with open(path, "rb") as f:
+        f.seek(4)
+        version = read_int(f, 4)
+        f.seek(0xE)
+        message_count = read_int(f, 2)
+        f.seek(0x18)
+        text_offset = read_int(f, 4)
+        f.seek(0x20)
+
+        offset_size = 2 if version == 503 else 4
+        offsets = []
+        last_offset = -1
+        offset_multiplier = 0
+
+        for _ in range(message_count):
+            f.read(4)
+            offset = read_int(f, offset_size)
+            f.read(offset_size)
+
+            if version == 503:
+                offset -= text_offset
+                real_offset = (
+                    text_offset
+                    + ((0xFFFF * offset_multiplier) + offset)
+                    + offset_multiplier
+                )
+
+                if real_offset < last_offset:
+                    offset_multiplier += 1
+                    real_offset = (
+                        text_offset
+                        + ((0xFFFF * offset_multiplier) + offset)
+                        + offset_multiplier
+                    )
+
+                offset = real_offset
+                last_offset = real_offset
+
+            offsets.append(offset)
+
+        for offset in offsets:
+            f.seek(offset)
+            text = b""
+
+            while True:
+                char = f.read(2) if version == 503 else f.read(1)
+
+                if int.from_bytes(char, "little") == 0:
+                    break
+
+                text += char
+
+            text = text.decode("utf-16" if version == 503 else "cp932")
+            priv_chars = "".join(c for c in text if unicodedata.category(c) in {"Co"})
+
+            for priv_char in priv_chars:
+                text = text.replace(priv_char, "{%s}" % ord(priv_char), 1)
+
+            texts.append(text)
+
+    return texts
+
+
+def buffer_parse(path):
+    return [text.text for text in CTDDecompile(path).text_entries]
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    paths = sorted(Path(sys.argv[1]).rglob("*.ctd"))
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    for path in paths:
+        if legacy_parse(path) != buffer_parse(path):
+            raise Exception(f"CTDDecompile output does not match for {path}")
+
+    size = sum(path.stat().st_size for path in paths)
+    print(f"{len(paths)} CTD files, {size} bytes")
+
+    for name, function in [("legacy", legacy_parse), ("CTDDecompile", buffer_parse)]:
+        elapsed = timeit.timeit(
+            lambda: [function(path) for path in paths], number=iterations
+        )
+        print(
+            f"{name:<14} {elapsed / iterations * 1000:10.3f} ms "
+            f"({size * iterations / elapsed / 1e6:.2f} MB/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
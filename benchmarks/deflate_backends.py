@@ -0,0 +1,60 @@
+"""Compare deflate backends available to CompressionPolicy on extracted assets.
+
+Usage: python -m benchmarks.deflate_backends <extracted_folder> [level] [strategy]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+from kingdomheartstools.helpers.CompressionPolicy import CompressionPolicy
+
+
+def read_assets(folder):
+    # Sidecars and the files written by archive-extract are not assets
+    return [
+        path.read_bytes()
+        for path in sorted(Path(folder).rglob("*"))
+        if path.is_file() and path.suffix != ".json"
+    ]
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    assets = read_assets(sys.argv[1])
+    level = int(sys.argv[2]) if len(sys.argv) > 2 else -1
+    strategy = sys.argv[3] if len(sys.argv) > 3 else "default"
+
+    total = sum(len(asset) for asset in assets)
+    incompressible = CompressionPolicy(level, strategy, "zlib", True)
+
+    print(f"{len(assets)} assets, {total} bytes, level {level}, {strategy} strategy")
+
+    for backend in CompressionPolicy.available_backends():
+        policy = CompressionPolicy(level, strategy, backend)
+
+        start = time.perf_counter()
+        compressed = sum(len(policy.compress(asset)) for asset in assets)
+        elapsed = time.perf_counter() - start
+
+        print(
+            f"{backend:<12} {total / elapsed / 1e6:10.2f} MB/s "
+            f"ratio {compressed / total:.4f}"
+        )
+
+    stored = [
+        path
+        for path in sorted(Path(sys.argv[1]).rglob("*"))
+        if path.is_file()
+        and path.suffix != ".json"
+        and not incompressible.should_compress(path)
+    ]
+
+    print(f"{len(stored)} assets would be stored uncompressed (--store-incompressible)")
+
+
+if __name__ == "__main__":
+    main()
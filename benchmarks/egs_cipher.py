@@ -0,0 +1,47 @@
+"""Compare EGSEncryption.decrypt_chunk against the collapsed-mask EGSCipher.
+
+Usage: python -m benchmarks.egs_cipher [size_in_bytes] [iterations]
+"""
+
+import os
+import sys
+import timeit
+
+from kingdomheartstools.helpers.EGSCipher import EGSCipher
+from kingdomheartstools.helpers.EGSEncryption import EGSEncryption
+
+
+def legacy_decrypt(seed, data):
+    key = EGSEncryption.generate_key(seed)
+
+    for i in range(0, min(len(data), 0x100), 0x10):
+        data = EGSEncryption.decrypt_chunk(key, data, i)
+
+    return data
+
+
+def cipher_decrypt(seed, data):
+    buffer = bytearray(data[: EGSCipher.encrypted_length])
+    return EGSCipher.decrypt(seed, buffer)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 0x100000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    seed = os.urandom(0x10)
+    data = os.urandom(size)
+
+    if legacy_decrypt(seed, data)[:0x100] != bytes(cipher_decrypt(seed, data)):
+        raise Exception("EGSCipher output does not match EGSEncryption")
+
+    for name, function in [
+        ("EGSEncryption", legacy_decrypt),
+        ("EGSCipher", cipher_decrypt),
+    ]:
+        elapsed = timeit.timeit(lambda: function(seed, data), number=iterations)
+        print(f"{name:<14} {size} bytes: {elapsed / iterations * 1000:10.3f} ms/asset")
+
+
+if __name__ == "__main__":
+    main()
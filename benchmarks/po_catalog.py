@@ -0,0 +1,108 @@
+"""Compare polib against Catalog on the messages of a CTD corpus (e.g. BBS).
+
+Every CTD in the folder is decompiled in memory, its messages are written and
+read back with both implementations (and as JSON Lines) in a temporary folder.
+The .po files have to be identical, and both readers have to return the same
+messages. Catalog follows polib 1.1.1 as pinned in poetry.lock, later versions
+also escape \\v, \\b and \\f.
+
+Usage: python -m benchmarks.po_catalog <folder_with_ctd_files> [iterations]
+"""
+
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+from polib import POEntry, POFile, pofile
+
+from kingdomheartstools.common.CatalogEntry import CatalogEntry
+from kingdomheartstools.helpers.Catalog import Catalog
+from kingdomheartstools.tools.ctd_decompile import CTDDecompile
+
+
+def polib_write(path, texts):
+    po = POFile()
+
+    for text in texts:
+        po.append(POEntry(msgid=text, msgstr=""))
+
+    po.save(path)
+
+
+def polib_read(path):
+    return [(entry.msgid, entry.msgstr) for entry in pofile(pofile=str(path))]
+
+
+def catalog_write(path, texts):
+    Catalog.write(path, [CatalogEntry(text) for text in texts])
+
+
+def catalog_read(path):
+    return [(entry.msgid, entry.msgstr) for entry in Catalog.read(path)]
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    corpus = [
+        [text.text for text in CTDDecompile(path).text_entries]
+        for path in sorted(Path(sys.argv[1]).rglob("*.ctd"))
+    ]
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    messages = sum(len(texts) for texts in corpus)
+
+    with tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+        polib_paths = [folder / f"{i}_polib.po" for i in range(len(corpus))]
+        catalog_paths = [folder / f"{i}_catalog.po" for i in range(len(corpus))]
+        jsonl_paths = [folder / f"{i}.jsonl" for i in range(len(corpus))]
+
+        for texts, polib_path, catalog_path, jsonl_path in zip(
+            corpus, polib_paths, catalog_paths, jsonl_paths
+        ):
+            polib_write(polib_path, texts)
+            catalog_write(catalog_path, texts)
+            catalog_write(jsonl_path, texts)
+
+            expected = [(text, "") for text in texts]
+
+            if polib_path.read_bytes() != catalog_path.read_bytes():
+                raise Exception(f"Catalog output differs from polib for {texts}")
+
+            if polib_read(polib_path) != expected:
+                raise Exception("polib did not read back its own catalog")
+
+            if catalog_read(polib_path) != expected:
+                raise Exception("Catalog did not read back the polib catalog")
+
+            if catalog_read(jsonl_path) != expected:
+                raise Exception("Catalog did not read back the JSON Lines catalog")
+
+        size = sum(path.stat().st_size for path in polib_paths)
+        print(f"{len(corpus)} catalogs, {messages} messages, {size} bytes of .po")
+
+        for name, function, paths in [
+            ("polib write", polib_write, polib_paths),
+            ("Catalog write", catalog_write, catalog_paths),
+            ("jsonl write", catalog_write, jsonl_paths),
+            ("polib read", polib_read, polib_paths),
+            ("Catalog read", catalog_read, catalog_paths),
+            ("jsonl read", catalog_read, jsonl_paths),
+        ]:
+            if "write" in name:
+                run = lambda: [function(*args) for args in zip(paths, corpus)]
+            else:
+                run = lambda: [function(path) for path in paths]
+
+            elapsed = timeit.timeit(run, number=iterations)
+            print(
+                f"{name:<14} {elapsed / iterations * 1000:10.3f} ms "
+                f"({messages * iterations / elapsed:.0f} messages/s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,23 @@
 import json
 import logging
 import os
+from contextlib import closing
 from pathlib import Path
+from typing import List, Optional
 
-from typer import Typer
+from typer import Exit, Typer, echo
 
+from kingdomheartstools.helpers.BuildCache import BuildCache
+from kingdomheartstools.helpers.CompressionPolicy import CompressionPolicy
 from kingdomheartstools.helpers.TIM2 import TIM2
+from kingdomheartstools.tools.archive_compact import ArchiveCompact
+from kingdomheartstools.tools.archive_diff import ArchiveDiff
 from kingdomheartstools.tools.archive_extract import ArchiveExtract
+from kingdomheartstools.tools.archive_list import ArchiveList
+from kingdomheartstools.tools.archive_patch import ArchivePatch
 from kingdomheartstools.tools.archive_repack import ArchiveRepack
+from kingdomheartstools.tools.archive_verify import ArchiveVerify
+from kingdomheartstools.tools.ctd_batch import CTDBatch
 from kingdomheartstools.tools.ctd_compile import CTDCompile
 from kingdomheartstools.tools.ctd_decompile import CTDDecompile
 from kingdomheartstools.tools.exia_extract import ExiaExtract
@@ -21,23 +31,159 @@ logger = logging.getLogger(__name__)
 
 
 @app.command()
-def archive_extract(input_path: str, output_path: str):
-    ArchiveExtract(input_path, output_path).extract()
+def archive_extract(
+    input_path: str,
+    output_path: str,
+    jobs: int = 1,
+    buffer_size: int = 0x100000,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None,
+    regex: Optional[List[str]] = None,
+    md5: Optional[List[str]] = None,
+    incremental: bool = False,
+    delete_removed: bool = False,
+    hash_content: bool = False,
+    sidecars: bool = True,
+):
+    ArchiveExtract(input_path, output_path, buffer_size).extract(
+        jobs,
+        include,
+        exclude,
+        regex,
+        md5,
+        incremental,
+        delete_removed,
+        hash_content,
+        sidecars,
+    )
 
 
 @app.command()
-def archive_repack(input_path: str, output_path: str):
-    ArchiveRepack(input_path, output_path).repack()
+def archive_list(input_path: str, output_format: str = "table"):
+    archive = ArchiveList(input_path)
+    echo(archive.to_json() if output_format == "json" else archive.to_table())
 
 
 @app.command()
-def ctd_decompile(input_path: str):
-    CTDDecompile(input_path).decompile()
+def archive_stat(input_path: str):
+    echo(json.dumps(ArchiveList(input_path).stat(), indent=4))
 
 
 @app.command()
-def ctd_compile(input_path: str):
-    CTDCompile(input_path).compile()
+def archive_diff(old_path: str, new_path: str, output_format: str = "table"):
+    diff = ArchiveDiff(old_path, new_path)
+    echo(diff.to_json() if output_format == "json" else diff.to_table())
+
+
+@app.command()
+def archive_verify(input_path: str, jobs: int = 1, report: Optional[str] = None):
+    result = ArchiveVerify(input_path).verify(jobs)
+
+    if report is not None:
+        with open(report, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4)
+    else:
+        echo(json.dumps(result, indent=4))
+
+    if result["errors"]:
+        raise Exit(code=1)
+
+
+@app.command()
+def archive_mount(input_path: str, mountpoint: str, cache_size: int = 0x10000000):
+    # fusepy is optional, so only import it when mounting
+    from kingdomheartstools.helpers.ArchiveFUSE import ArchiveFUSE
+
+    ArchiveFUSE.mount(input_path, mountpoint, cache_size)
+
+
+@app.command()
+def archive_repack(
+    input_path: str,
+    output_path: str,
+    jobs: int = 1,
+    base: Optional[str] = None,
+    compression_level: int = -1,
+    compression_strategy: str = "default",
+    compression_backend: str = "auto",
+    store_incompressible: bool = False,
+    dedup: bool = False,
+    dry_run: bool = False,
+):
+    policy = CompressionPolicy(
+        compression_level,
+        compression_strategy,
+        compression_backend,
+        store_incompressible,
+    )
+    repack = ArchiveRepack(input_path, output_path, base, policy, dedup)
+
+    if dry_run:
+        echo(json.dumps(repack.estimate(jobs), indent=4))
+    else:
+        repack.repack(jobs)
+
+
+@app.command()
+def archive_patch(input_path: str, archive_path: str, drop_remastered: bool = False):
+    ArchivePatch(input_path, archive_path).patch(drop_remastered)
+
+
+@app.command()
+def archive_compact(input_path: str):
+    ArchiveCompact(input_path).compact()
+
+
+@app.command()
+def ctd_decompile(input_path: str, catalog_format: str = "po"):
+    CTDDecompile(input_path, catalog_format).decompile()
+
+
+@app.command()
+def ctd_compile(input_path: str, force: bool = False, build_cache: bool = True):
+    ctd = CTDCompile(input_path)
+
+    with closing(BuildCache(enabled=build_cache)) as cache:
+        cache.run(
+            BuildCache.get_key("ctd-compile", ctd.output_path),
+            ctd.inputs,
+            ctd.compile,
+            ctd.outputs,
+            force,
+        )
+
+
+@app.command()
+def ctd_decompile_all(
+    input_folder: str, jobs: Optional[int] = None, catalog_format: str = "po"
+):
+    _report_ctd_batch(
+        CTDBatch(input_folder, jobs, catalog_format=catalog_format).decompile_all()
+    )
+
+
+@app.command()
+def ctd_compile_all(
+    input_folder: str,
+    jobs: Optional[int] = None,
+    force: bool = False,
+    build_cache: bool = True,
+):
+    with closing(BuildCache(enabled=build_cache)) as cache:
+        _report_ctd_batch(CTDBatch(input_folder, jobs, cache, force).compile_all())
+
+
+def _report_ctd_batch(result):
+    echo(
+        f"{result['files']} files ({result['failed']} failed"
+        f", {result['skipped']} up to date), "
+        f"{result['messages']} messages in {result['seconds']}s: "
+        f"{result['filesPerSecond']} files/s, "
+        f"{result['messagesPerSecond']} messages/s"
+    )
+
+    if result["failed"]:
+        raise Exit(code=1)
 
 
 @app.command()
@@ -46,8 +192,17 @@ def font_extract(input_path: str):
 
 
 @app.command()
-def font_generate(font_folder: str):
-    FontGenerate(font_folder).generate()
+def font_generate(font_folder: str, force: bool = False, build_cache: bool = True):
+    font = FontGenerate(font_folder)
+
+    with closing(BuildCache(enabled=build_cache)) as cache:
+        cache.run(
+            BuildCache.get_key("font-generate", font_folder),
+            font.inputs,
+            font.generate,
+            font.outputs,
+            force,
+        )
 
 
 @app.command()
@@ -56,52 +211,105 @@ def l2d_convert(input_path: str):
 
 
 @app.command()
-def l2d_build(input_folder: str, original_file_path: str):
-    L2DBuild(input_folder, original_file_path).build()
+def l2d_build(
+    input_folder: str,
+    original_file_path: str,
+    force: bool = False,
+    build_cache: bool = True,
+):
+    l2d = L2DBuild(input_folder, original_file_path)
+
+    with closing(BuildCache(enabled=build_cache)) as cache:
+        cache.run(
+            BuildCache.get_key("l2d-build", original_file_path),
+            l2d.inputs,
+            l2d.build,
+            l2d.outputs,
+            force,
+        )
 
 
 @app.command()
-def exia_extract(input_path: str):
-    ExiaExtract(input_path).extract()
+def exia_extract(input_path: str, catalog_format: str = "po"):
+    ExiaExtract(input_path, catalog_format).extract()
 
 
 @app.command()
-def extract_supported(input_folder: str):
-    for root, dirs, files in os.walk(input_folder):
-        font_dir = False
+def extract_supported(input_folder: str, force: bool = False, build_cache: bool = True):
+    with closing(BuildCache(enabled=build_cache)) as cache:
+        for root, dirs, files in os.walk(input_folder):
+            font_dir = False
+
+            for file in files:
+                full_path = Path(root) / file
+                outputs = None
 
-        for file in files:
-            full_path = os.path.join(root, file)
-            try:
-                if file.endswith(".ctd"):
-                    logging.info(f"Extracting {full_path}...")
-                    CTDDecompile(os.path.join(root, file)).decompile()
+                # Converters parse their input when constructed, so they are
+                # only created once the cache decided to rebuild
 
-                if file.endswith(".inf"):
-                    logging.info(f"Extracting {full_path}...")
-                    font_dir = True
-                    FontExtract(os.path.join(root, file)).extract()
+                try:
+                    if file.endswith(".ctd"):
+                        logging.info(f"Extracting {full_path}...")
+                        inputs = [full_path]
+                        build = lambda: CTDDecompile(full_path).decompile()
+                        outputs = [
+                            full_path.with_suffix(".meta"),
+                            full_path.with_suffix(".po"),
+                        ]
 
-                if file.endswith(".l2d"):
-                    logging.info(f"Extracting {full_path}...")
-                    L2DConvert(os.path.join(root, file)).convert()
+                    if file.endswith(".inf"):
+                        logging.info(f"Extracting {full_path}...")
+                        font_dir = True
+                        inputs = [
+                            full_path.with_suffix(extension)
+                            for extension in [".inf", ".cod", ".tm2"]
+                        ]
+                        build = lambda: FontExtract(full_path).extract()
+                        outputs = [full_path.with_suffix("")]
 
-                if file.endswith(".exia2"):
-                    logging.info(f"Extracting {full_path}...")
-                    ExiaExtract(os.path.join(root, file)).extract()
+                    if file.endswith(".l2d"):
+                        logging.info(f"Extracting {full_path}...")
+                        inputs = [full_path]
+                        build = lambda: L2DConvert(full_path).convert()
+                        outputs = [full_path.parent / full_path.stem]
 
-                if file.endswith(".tm2") and not font_dir:
-                    logging.info(f"Extracting {full_path}...")
+                    if file.endswith(".exia2"):
+                        logging.info(f"Extracting {full_path}...")
+                        inputs = [full_path]
+                        build = lambda: ExiaExtract(full_path).extract()
+                        outputs = [full_path.with_suffix(".po")]
 
-                    tim = TIM2(path=os.path.join(root, file))
+                    if file.endswith(".tm2") and not font_dir:
+                        logging.info(f"Extracting {full_path}...")
+                        inputs = [full_path]
+                        outputs = []
+                        build = lambda: outputs.extend(_extract_tim2(root, file))
 
-                    for i in range(tim.numImages):
-                        tim.get_image(i).save(
-                            os.path.join(root, f"{Path(file).stem}_{i}.png")
+                    if outputs is not None:
+                        cache.run(
+                            BuildCache.get_key("extract", full_path),
+                            inputs,
+                            build,
+                            lambda: outputs,
+                            force,
                         )
+                except Exception as e:
+                    logger.exception(e)
+
+
+def _extract_tim2(root, file):
+    """Save every image of a TIM2 file as PNG + JSON, return the written paths."""
+    tim = TIM2(path=os.path.join(root, file))
+    outputs = []
+
+    for i in range(tim.numImages):
+        outputs.append(os.path.join(root, f"{Path(file).stem}_{i}.png"))
+        tim.get_image(i).save(outputs[-1])
+
+        outputs.append(os.path.join(root, f"{file}_{i}.json"))
+
+        with open(outputs[-1], "w") as f:
+            meta = tim.get_image_data(i)
+            json.dump(meta, f)
 
-                        with open(os.path.join(root, f"{file}_{i}.json"), "w") as f:
-                            meta = tim.get_image_data(i)
-                            json.dump(meta, f)
-            except Exception as e:
-                logger.exception(e)
+    return outputs
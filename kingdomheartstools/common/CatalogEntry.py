@@ -0,0 +1,7 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class CatalogEntry:
+    msgid: str
+    msgstr: str = ""
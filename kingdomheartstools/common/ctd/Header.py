@@ -1,4 +1,6 @@
 from dataclasses import dataclass
+from struct import Struct
+from typing import ClassVar
 
 
 @dataclass
@@ -17,3 +19,6 @@ class Header:
     text_offset: int
 
     unknown_3: int
+
+    # Binary layout of the header, shared by CTDDecompile and CTDCompile
+    struct: ClassVar[Struct] = Struct("<4sIHHHHIIII")
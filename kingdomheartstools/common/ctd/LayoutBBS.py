@@ -1,4 +1,6 @@
 from dataclasses import dataclass
+from struct import Struct
+from typing import ClassVar
 
 
 @dataclass
@@ -21,3 +23,5 @@ class LayoutBBS:
     unknown_2: int
     unknown_3: int
     unknown_4: int
+
+    struct: ClassVar[Struct] = Struct("<4H4B10H")
@@ -1,4 +1,6 @@
 from dataclasses import dataclass
+from struct import Struct
+from typing import ClassVar
 
 
 @dataclass
@@ -15,3 +17,5 @@ class LayoutReMIX:
     unknown_10: int
     unknown_11: int
     unknown_12: int
+
+    struct: ClassVar[Struct] = Struct("<4H4B4H")
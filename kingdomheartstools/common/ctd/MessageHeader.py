@@ -1,4 +1,6 @@
 from dataclasses import dataclass
+from struct import Struct
+from typing import ClassVar
 
 
 @dataclass
@@ -7,3 +9,10 @@ class MessageHeader:
     set: int
     offset: int
     layoutIndex: int
+
+    # Version 503 (ReMIX) stores 16-bit offsets, every other version 32-bit
+    structs: ClassVar[dict] = {503: Struct("<HHHH"), 1: Struct("<HHII")}
+
+    @classmethod
+    def get_struct(cls, version):
+        return cls.structs.get(version, cls.structs[1])
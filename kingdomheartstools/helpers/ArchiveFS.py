@@ -0,0 +1,316 @@
+import io
+import os
+import stat
+import threading
+from collections import OrderedDict
+from pathlib import PurePosixPath
+
+from ..tools.archive_extract import ArchiveExtract
+
+
+class ArchiveFS:
+    """Read-only filesystem view of a .hed/.pkg archive.
+
+    Paths follow the layout ``ArchiveExtract.extract`` writes to disk,
+    including ``remastered_<file>`` folders for remastered assets. Assets are
+    decoded in ``block_size`` blocks, which are kept in an LRU cache capped
+    at ``cache_size`` bytes. The decoder of the last block read from an
+    asset is kept, so sequential reads never inflate the same data twice.
+    """
+
+    block_size = 0x100000
+    max_decoders = 64
+
+    def __init__(self, input_path, cache_size=0x10000000):
+        self.archive = ArchiveExtract(input_path)
+        self.cache_size = cache_size
+
+        self.__cache = OrderedDict()
+        self.__cache_used = 0
+        self.__decoders = OrderedDict()
+        self.__lock = threading.Lock()
+
+        self.__files = set(self.archive.select())
+        self.__directories = {"": set()}
+        self.__assets = {}
+
+        for filename in self.__files:
+            parts = PurePosixPath(filename).parts
+
+            for i in range(len(parts)):
+                parent = "/".join(parts[:i])
+                self.__directories.setdefault(parent, set()).add(parts[i])
+
+    def listdir(self, path=""):
+        kind, filename, remastered_name = self.__resolve(path)
+
+        if kind != "dir":
+            raise NotADirectoryError(path)
+
+        if filename is None:
+            path = self.__normalize(path)
+            entries = set(self.__directories[path])
+
+            for name in self.__directories[path]:
+                child = f"{path}/{name}" if path else name
+
+                if child in self.__files and self.__get_asset(child)[1]:
+                    entries.add(f"remastered_{name}")
+
+            return sorted(entries)
+
+        prefix = f"{remastered_name}/" if remastered_name else ""
+
+        return sorted(
+            set(
+                name[len(prefix) :].split("/")[0]
+                for name in self.__get_asset(filename)[1]
+                if name.startswith(prefix)
+            )
+        )
+
+    def stat(self, path):
+        kind, filename, remastered_name = self.__resolve(path)
+
+        if kind == "dir":
+            return os.stat_result((stat.S_IFDIR | 0o555, 0, 0, 2, 0, 0, 0, 0, 0, 0))
+
+        asset_header, remastered = self.__get_asset(filename)
+        header = (
+            asset_header if remastered_name is None else remastered[remastered_name]
+        )
+        timestamp = int(asset_header.creationDate.timestamp())
+
+        return os.stat_result(
+            (
+                stat.S_IFREG | 0o444,
+                0,
+                0,
+                1,
+                0,
+                0,
+                header.decompressedLength,
+                timestamp,
+                timestamp,
+                timestamp,
+            )
+        )
+
+    def exists(self, path):
+        try:
+            self.__resolve(path)
+        except FileNotFoundError:
+            return False
+
+        return True
+
+    def isdir(self, path):
+        return self.exists(path) and self.__resolve(path)[0] == "dir"
+
+    def open(self, path):
+        """Return a seekable, read-only file object for an asset.
+
+        Reads go through ``read``, so only the blocks that are actually read
+        are decoded.
+        """
+        if self.isdir(path):
+            raise IsADirectoryError(path)
+
+        return io.BufferedReader(
+            AssetReader(self, path, self.stat(path).st_size), self.block_size
+        )
+
+    def read_bytes(self, path):
+        return self.read(path, self.stat(path).st_size)
+
+    def read(self, path, size, offset=0):
+        """Return up to ``size`` bytes of an asset starting at ``offset``."""
+        kind, filename, remastered_name = self.__resolve(path)
+
+        if kind == "dir":
+            raise IsADirectoryError(path)
+
+        path = self.__normalize(path)
+        end = min(offset + size, self.stat(path).st_size)
+        chunks = []
+
+        for index in range(offset // self.block_size, -(-end // self.block_size)):
+            block = self.__get_block(path, filename, remastered_name, index)
+            start = index * self.block_size
+            chunks.append(block[max(offset - start, 0) : end - start])
+
+        return b"".join(chunks)
+
+    def __get_block(self, path, filename, remastered_name, index):
+        with self.__lock:
+            if (path, index) in self.__cache:
+                self.__cache.move_to_end((path, index))
+                return self.__cache[(path, index)]
+
+            # Continue from the last block read if possible, inflating from
+            # the start of the asset is only needed when reading backwards
+            decoder = self.__decoders.pop(path, None)
+
+        # A decoder is [blocks, index of the next block, last block]
+        if decoder is None or decoder[1] > index + 1:
+            decoder = [self.__iter_blocks(filename, remastered_name, index), index, b""]
+
+        if decoder[1] == index + 1:
+            block = decoder[2]
+        else:
+            for block_index, block in decoder[0]:
+                decoder[1:] = [block_index + 1, block]
+
+                if block_index == index:
+                    break
+            else:
+                block = b""
+
+        with self.__lock:
+            self.__decoders[path] = decoder
+
+            while len(self.__decoders) > self.max_decoders:
+                self.__decoders.popitem(last=False)
+
+            if (path, index) not in self.__cache:
+                self.__cache[(path, index)] = block
+                self.__cache_used += len(block)
+
+            while self.__cache_used > self.cache_size:
+                _, evicted = self.__cache.popitem(last=False)
+                self.__cache_used -= len(evicted)
+
+        return block
+
+    def __iter_blocks(self, filename, remastered_name, first_index):
+        """Yield (index, block) for the decoded asset, from ``first_index`` on."""
+        encryption_key, blocks = self.archive.package.read_asset(
+            self.archive.get_entry(filename).offset
+        )
+
+        if remastered_name is None:
+            header, data_offset = blocks[0]
+        else:
+            header, data_offset = next(
+                block for block in blocks[1:] if block[0].name == remastered_name
+            )
+
+        skip = first_index * self.block_size
+        index = first_index
+        pending = bytearray()
+
+        for chunk in self.archive.package.iter_data(
+            encryption_key, header, data_offset, self.block_size
+        ):
+            if skip >= len(chunk):
+                skip -= len(chunk)
+                continue
+
+            pending += chunk[skip:]
+            skip = 0
+
+            while len(pending) >= self.block_size:
+                yield index, bytes(pending[: self.block_size])
+                del pending[: self.block_size]
+                index += 1
+
+        if pending:
+            yield index, bytes(pending)
+
+    def __get_asset(self, filename):
+        """Return the asset header and remastered headers (by name) of a file."""
+        if filename not in self.__assets:
+            entry = self.archive.get_entry(filename)
+            _, blocks = self.archive.package.read_asset(entry.offset)
+
+            self.__assets[filename] = (
+                blocks[0][0],
+                {header.name: header for header, _ in blocks[1:]},
+            )
+
+        return self.__assets[filename]
+
+    def __resolve(self, path):
+        """Return (kind, filename, remastered name) for a path.
+
+        ``filename`` is only set for files and for folders inside a
+        remastered folder.
+        """
+        path = self.__normalize(path)
+
+        if path in self.__directories:
+            return "dir", None, None
+
+        if path in self.__files:
+            return "file", path, None
+
+        parts = PurePosixPath(path).parts
+
+        for i, part in enumerate(parts):
+            if not part.startswith("remastered_"):
+                continue
+
+            parent = "/".join(parts[:i] + (part[len("remastered_") :],))
+
+            if parent not in self.__files:
+                continue
+
+            remastered = self.__get_asset(parent)[1]
+            remastered_name = "/".join(parts[i + 1 :])
+
+            if remastered_name in remastered:
+                return "file", parent, remastered_name
+
+            if remastered and (
+                remastered_name == ""
+                or any(name.startswith(f"{remastered_name}/") for name in remastered)
+            ):
+                return "dir", parent, remastered_name
+
+        raise FileNotFoundError(path)
+
+    @staticmethod
+    def __normalize(path):
+        path = PurePosixPath("/", str(path).replace("\\", "/")).as_posix()
+        return path.strip("/")
+
+
+class AssetReader(io.RawIOBase):
+    """Raw, seekable reader of one asset of an ``ArchiveFS``."""
+
+    def __init__(self, fs, path, size):
+        self.fs = fs
+        self.path = path
+        self.size = size
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.fs.read(self.path, len(buffer), self.position)
+        buffer[: len(data)] = data
+        self.position += len(data)
+
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        elif whence != io.SEEK_SET:
+            raise ValueError(f"Invalid whence: {whence}")
+
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+
+        self.position = offset
+
+        return self.position
+
+    def tell(self):
+        return self.position
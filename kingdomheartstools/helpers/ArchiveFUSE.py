@@ -0,0 +1,69 @@
+import errno
+import logging
+
+from fuse import FUSE, FuseOSError, Operations
+
+from .ArchiveFS import ArchiveFS
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveFUSE(Operations):
+    """FUSE operations exposing an ``ArchiveFS`` as a read-only mount.
+
+    Requires the optional ``fusepy`` package.
+    """
+
+    def __init__(self, input_path, cache_size=0x10000000):
+        self.fs = ArchiveFS(input_path, cache_size)
+
+    def getattr(self, path, fh=None):
+        try:
+            result = self.fs.stat(path)
+        except FileNotFoundError:
+            raise FuseOSError(errno.ENOENT)
+
+        return {
+            "st_mode": result.st_mode,
+            "st_nlink": result.st_nlink,
+            "st_size": result.st_size,
+            "st_atime": result.st_atime,
+            "st_mtime": result.st_mtime,
+            "st_ctime": result.st_ctime,
+        }
+
+    def readdir(self, path, fh):
+        try:
+            return [".", ".."] + self.fs.listdir(path)
+        except FileNotFoundError:
+            raise FuseOSError(errno.ENOENT)
+        except NotADirectoryError:
+            raise FuseOSError(errno.ENOTDIR)
+
+    def open(self, path, flags):
+        if flags & 3 != 0:  # O_WRONLY or O_RDWR
+            raise FuseOSError(errno.EROFS)
+
+        if not self.fs.exists(path):
+            raise FuseOSError(errno.ENOENT)
+
+        return 0
+
+    def read(self, path, size, offset, fh):
+        try:
+            return self.fs.read(path, size, offset)
+        except FileNotFoundError:
+            raise FuseOSError(errno.ENOENT)
+        except IsADirectoryError:
+            raise FuseOSError(errno.EISDIR)
+
+    @staticmethod
+    def mount(input_path, mountpoint, cache_size=0x10000000, foreground=True):
+        logger.info(f"Mounting {input_path} at {mountpoint}...")
+        FUSE(
+            ArchiveFUSE(input_path, cache_size),
+            mountpoint,
+            foreground=foreground,
+            ro=True,
+            nothreads=False,
+        )
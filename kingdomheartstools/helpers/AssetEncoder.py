@@ -0,0 +1,205 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import filedate
+
+from .CompressionPolicy import CompressionPolicy
+from .EGSCipher import EGSCipher
+
+logger = logging.getLogger(__name__)
+
+
+class AssetEncoder:
+    """Turn files of an extracted archive back into stored asset records."""
+
+    def __init__(self, input_path, buffer_size=0x100000, policy=None, manifest=None):
+        self.input_path = input_path
+        self.buffer_size = buffer_size
+        self.policy = policy if policy is not None else CompressionPolicy()
+        self.manifest = manifest if manifest is not None else {}
+
+    def get_file_config(self, filename):
+        """Return the encrypt/compress flags and timestamp of a file.
+
+        They come from the manifest record when there is one, so folders
+        with a manifest need no per-file reads. Otherwise the ``<file>.json``
+        sidecar is read, with the file's creation date as the timestamp.
+        """
+        record = self.manifest.get(filename)
+
+        if record is not None and "encrypt" in record:
+            return {
+                "encrypt": record["encrypt"],
+                "compress": record["compress"],
+                "timestamp": record["timestamp"],
+            }
+
+        filepath = f"{self.input_path}/{filename}"
+
+        try:
+            with open(f"{filepath}.json", "r") as f:
+                file_config = json.load(f)
+        except FileNotFoundError:
+            raise Exception(f"No sidecar or manifest record for {filename}")
+
+        file_dates = filedate.File(filepath).get()
+        file_config["timestamp"] = int(file_dates.get("created").timestamp())
+
+        return file_config
+
+    def encode_to(self, filename, target):
+        """Stream a single file into ``target`` as a stored asset record.
+
+        The record is written at the current position of ``target``, which
+        must be seekable: the asset header and the encrypted start of the
+        data are back-patched once the compressed length is known, so only
+        ``buffer_size`` bytes of the file are held in memory at a time
+        (unless the policy's backend buffers, see ``CompressionPolicy``).
+        Returns the asset header and the length of the stored data.
+        """
+        filepath = f"{self.input_path}/{filename}"
+        file_config = self.get_file_config(filename)
+
+        start = target.tell()
+        target.write(bytes(0x10))
+
+        # The first bytes of the stored data are encrypted with the final
+        # header as the key, so keep them around until it is known
+        head = bytearray()
+
+        # Assets that deflate would not shrink can be stored encrypted only
+        compress = file_config["compress"] and (
+            not file_config["encrypt"] or self.policy.should_compress(filepath)
+        )
+        compressor = self.policy.compressobj() if compress else None
+        decompressed_length = 0
+
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(self.buffer_size), b""):
+                decompressed_length += len(chunk)
+                self.__write_stored(target, compressor, chunk, head)
+
+        if not file_config["encrypt"]:
+            compressed_length = -2
+        elif not compress:
+            compressed_length = -1
+
+        # Only the stored bytes are padded, padding fed to the compressor
+        # would come back as part of the file on extraction
+        if compress:
+            self.__write_stored(target, None, compressor.flush(), head)
+            compressed_length = target.tell() - start - 0x10
+            self.__write_stored(target, None, self.get_padding(compressed_length), head)
+        else:
+            self.__write_stored(
+                target, None, self.get_padding(decompressed_length), head
+            )
+
+        data_size = target.tell() - start - 0x10
+        timestamp = file_config["timestamp"]
+
+        asset_header = (
+            int.to_bytes(decompressed_length, 4, "little")
+            + int.to_bytes(0, 4, "little")
+            + int.to_bytes(compressed_length, 4, "little", signed=True)
+            + int.to_bytes(timestamp, 4, "little")
+        )
+
+        if file_config["encrypt"]:
+            # Only the stored length is encrypted, not the 0xCD padding
+            stored_length = (
+                compressed_length if compressed_length >= 0 else decompressed_length
+            )
+            EGSCipher.encrypt(asset_header, memoryview(head)[:stored_length])
+
+        target.seek(start)
+        target.write(asset_header)
+        target.write(head)
+        target.seek(start + 0x10 + data_size)
+
+        return asset_header, data_size
+
+    @staticmethod
+    def __write_stored(target, compressor, data, head):
+        if compressor is not None:
+            data = compressor.compress(data)
+
+        if len(head) < EGSCipher.encrypted_length:
+            head += data[: EGSCipher.encrypted_length - len(head)]
+
+        target.write(data)
+
+    def is_unchanged(self, filename, record, package, entry):
+        """Check whether the asset stored at ``entry`` still matches the file.
+
+        ``record`` is the file's manifest.json record. The entry must be the
+        one that was extracted (same lengths), the sidecar flags must match
+        the stored asset and the file and its remastered assets must still
+        have the size and mtime (or content hash) recorded at extraction time.
+        """
+        if (
+            record is None
+            or record.get("removed")
+            or record["dataLength"] != entry.dataLength
+            or record["actualLength"] != entry.actualLength
+        ):
+            return False
+
+        filepath = Path(self.input_path) / filename
+        file_config = self.get_file_config(filename)
+
+        _, blocks = package.read_asset(entry.offset)
+        compressed_length = blocks[0][0].compressedLength
+
+        if (
+            file_config["encrypt"] != (compressed_length > -2)
+            or file_config["compress"] != (compressed_length > -1)
+            or not self.__is_file_unchanged(filepath, record)
+        ):
+            return False
+
+        remastered_folder = filepath.parent / f"remastered_{filepath.name}"
+
+        for name, remastered_record in record["remastered"].items():
+            if not self.__is_file_unchanged(
+                remastered_folder / name, remastered_record
+            ):
+                logger.warning(
+                    f"Remastered assets of {filename} were modified, "
+                    "repacking them is not supported yet"
+                )
+                return False
+
+        return True
+
+    @staticmethod
+    def __is_file_unchanged(path, record):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+
+        if stat.st_size != record["size"]:
+            return False
+
+        if stat.st_mtime_ns == record["mtime"]:
+            return True
+
+        if "sha1" not in record:
+            return False
+
+        content_hash = hashlib.sha1()
+
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(0x100000), b""):
+                content_hash.update(chunk)
+
+        return content_hash.hexdigest() == record["sha1"]
+
+    @staticmethod
+    def get_padding(length):
+        """Return the 0xCD bytes that pad ``length`` to 16 bytes."""
+        return b"\xCD" * (-length % 16)
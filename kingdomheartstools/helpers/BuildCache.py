@@ -0,0 +1,155 @@
+import hashlib
+import json
+import logging
+import sqlite3
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class BuildCache:
+    """Remember what converters built, so that unchanged inputs are skipped.
+
+    Every build is stored under a key with the size, mtime and SHA-1 of its
+    input and output files (folders stand for all the files inside them).
+    A build is fresh while all of those files still have the recorded
+    contents. Sizes and mtimes are compared first, files are only hashed
+    again when those changed.
+
+    When ``enabled`` is not set, or the database cannot be opened (e.g. a
+    read-only home folder), every build runs and nothing is recorded.
+    """
+
+    def __init__(self, path=None, enabled=True):
+        self.path = path
+        self.db = None
+
+        if not enabled:
+            return
+
+        try:
+            if self.path is None:
+                self.path = (
+                    Path.home() / ".cache" / "kingdomheartstools" / "build_cache.db"
+                )
+
+            self.path = Path(self.path)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            self.db = sqlite3.connect(self.path, timeout=30)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS builds "
+                "(key TEXT PRIMARY KEY, inputs TEXT NOT NULL, outputs TEXT NOT NULL)"
+            )
+        except (OSError, RuntimeError, sqlite3.Error) as e:
+            logger.warning(f"Cannot open the build cache ({e}), building everything")
+
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+
+    @staticmethod
+    def get_key(converter, path):
+        return f"{converter}:{Path(path).resolve()}"
+
+    def run(self, key, inputs, build, outputs, force=False):
+        """Call ``build`` unless the build recorded under ``key`` is fresh.
+
+        ``outputs`` may be a callable, for converters that only know what
+        they wrote after building. Returns whether ``build`` was called.
+        """
+        if not force and self.is_fresh(key, inputs):
+            logger.info(f"{key} is up to date, skipping...")
+            return False
+
+        build()
+        self.update(key, inputs, outputs() if callable(outputs) else outputs)
+
+        return True
+
+    def is_fresh(self, key, inputs):
+        if self.db is None:
+            return False
+
+        row = self.db.execute(
+            "SELECT inputs, outputs FROM builds WHERE key = ?", (key,)
+        ).fetchone()
+
+        if row is None:
+            return False
+
+        recorded_inputs = json.loads(row[0])
+        recorded_outputs = json.loads(row[1])
+
+        # A new or removed input (e.g. another glyph PNG) needs a rebuild too
+        if set(recorded_inputs) != {str(path) for path in self.__expand(inputs)}:
+            return False
+
+        return all(
+            self.__is_unchanged(path, record)
+            for path, record in {**recorded_inputs, **recorded_outputs}.items()
+        )
+
+    def update(self, key, inputs, outputs):
+        if self.db is None:
+            return
+
+        self.db.execute(
+            "INSERT OR REPLACE INTO builds VALUES (?, ?, ?)",
+            (
+                key,
+                json.dumps(self.__get_records(inputs)),
+                json.dumps(self.__get_records(outputs)),
+            ),
+        )
+        self.db.commit()
+
+    def __get_records(self, paths):
+        records = {}
+
+        for path in self.__expand(paths):
+            stat = path.stat()
+            records[str(path)] = [stat.st_size, stat.st_mtime_ns, self.__hash(path)]
+
+        return records
+
+    @staticmethod
+    def __expand(paths):
+        files = []
+
+        for path in (Path(path).resolve() for path in paths):
+            if path.is_dir():
+                files.extend(
+                    sorted(child for child in path.rglob("*") if child.is_file())
+                )
+            elif path.exists():
+                files.append(path)
+
+        return files
+
+    def __is_unchanged(self, path, record):
+        size, mtime, content_hash = record
+
+        try:
+            stat = Path(path).stat()
+        except FileNotFoundError:
+            return False
+
+        if stat.st_size != size:
+            return False
+
+        return stat.st_mtime_ns == mtime or self.__hash(path) == content_hash
+
+    @staticmethod
+    def __hash(path):
+        content_hash = hashlib.sha1()
+
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(0x100000), b""):
+                content_hash.update(chunk)
+
+        return content_hash.hexdigest()
@@ -0,0 +1,257 @@
+import json
+import logging
+import re
+import textwrap
+from pathlib import Path
+
+from polib import pofile
+
+from ..common.CatalogEntry import CatalogEntry
+
+logger = logging.getLogger(__name__)
+
+
+class Catalog:
+    """Read and write the message catalogs of the CTD and Exia tools.
+
+    Two formats are supported, picked by file extension:
+
+    * ``.po`` - gettext catalogs. Only the subset the tools emit is handled
+      here (``msgid``/``msgstr`` with continuation lines, comments and the
+      usual escapes). Anything else, like plurals, contexts, obsolete entries
+      or non UTF-8 files, is read with polib instead. Files are written with
+      exactly the layout and escapes of polib 1.1.1 (the version in
+      poetry.lock), so existing catalogs do not change.
+    * ``.jsonl`` - one ``{"msgid": ..., "msgstr": ...}`` object per line.
+    """
+
+    extensions = [".po", ".jsonl"]
+
+    wrap_width = 78
+
+    __po_header = '#\nmsgid ""\nmsgstr ""\n'
+    __escape_chars = '\\\n\r\t"'
+    __escape_sequence = re.compile(r'\\(\\|n|t|r|")')
+    __unescaped_quote = re.compile(r'([^\\]|^)"')
+    __unescapes = {
+        "n": "\n",
+        "t": "\t",
+        "r": "\r",
+        "\\": "\\",
+        '"': '"',
+    }
+
+    @classmethod
+    def get_path(cls, path, catalog_format):
+        extension = f".{catalog_format}"
+
+        if extension not in cls.extensions:
+            raise Exception(f"Unsupported catalog format: {catalog_format}")
+
+        return Path(path).with_suffix(extension)
+
+    @classmethod
+    def find(cls, path):
+        """Catalog that belongs to ``path`` (.po first, then .jsonl)."""
+        path = Path(path)
+
+        if path.suffix in cls.extensions:
+            return path
+
+        for extension in cls.extensions:
+            if path.with_suffix(extension).exists():
+                return path.with_suffix(extension)
+
+        return path.with_suffix(cls.extensions[0])
+
+    @classmethod
+    def read(cls, path):
+        path = Path(path)
+
+        if path.suffix == ".jsonl":
+            return cls.__read_jsonl(path)
+
+        try:
+            with open(path, "r", encoding="utf-8-sig") as f:
+                entries = cls.__parse_po(f.read())
+        except UnicodeDecodeError:
+            entries = None
+
+        if entries is None:
+            logger.debug(f"{path} is not a plain catalog, reading it with polib")
+            entries = [
+                CatalogEntry(entry.msgid, entry.msgstr)
+                for entry in pofile(pofile=str(path))
+            ]
+
+        return entries
+
+    @classmethod
+    def write(cls, path, entries):
+        path = Path(path)
+
+        if path.suffix not in cls.extensions:
+            raise Exception(f"Unsupported catalog format: {path.suffix}")
+
+        if path.suffix == ".jsonl":
+            lines = [
+                json.dumps(
+                    {"msgid": entry.msgid, "msgstr": entry.msgstr},
+                    ensure_ascii=False,
+                )
+                + "\n"
+                for entry in entries
+            ]
+        else:
+            lines = [cls.__po_header]
+
+            for entry in entries:
+                lines.append(
+                    f"\n{cls.__format_field('msgid', entry.msgid)}"
+                    f"\n{cls.__format_field('msgstr', entry.msgstr)}\n"
+                )
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(lines))
+
+    @staticmethod
+    def __read_jsonl(path):
+        entries = []
+
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    entries.append(
+                        CatalogEntry(record["msgid"], record.get("msgstr", ""))
+                    )
+
+        return entries
+
+    @classmethod
+    def __parse_po(cls, text):
+        """Entries of a plain catalog, None if it needs the full parser."""
+        entries = []
+        msgid = msgstr = None
+        field = None
+
+        for line in text.split("\n"):
+            line = line.strip()
+
+            if not line:
+                continue
+
+            if line[0] == "#":
+                if line.startswith("#~"):
+                    return None
+
+                continue
+
+            if line[0] == '"':
+                keyword, value = None, line
+            else:
+                keyword, _, value = line.partition(" ")
+                value = value.lstrip()
+
+            if len(value) < 2 or value[0] != '"' or value[-1] != '"':
+                return None
+
+            value = value[1:-1]
+
+            if '"' in value and cls.__unescaped_quote.search(value):
+                return None
+
+            if "\\" in value:
+                value = cls.__unescape(value)
+
+            if keyword is None:
+                if field == "msgid":
+                    msgid += value
+                elif field == "msgstr":
+                    msgstr += value
+                else:
+                    return None
+            elif keyword == "msgid":
+                if msgstr is not None:
+                    entries.append(CatalogEntry(msgid, msgstr))
+                elif msgid is not None:
+                    return None
+
+                msgid, msgstr, field = value, None, "msgid"
+            elif keyword == "msgstr":
+                if msgid is None or msgstr is not None:
+                    return None
+
+                msgstr, field = value, "msgstr"
+            else:
+                return None
+
+        if msgid is not None:
+            if msgstr is None:
+                return None
+
+            entries.append(CatalogEntry(msgid, msgstr))
+
+        # Like polib, the first entry with an empty msgid is the header
+        for i, entry in enumerate(entries):
+            if entry.msgid == "":
+                del entries[i]
+                break
+
+        return entries
+
+    @classmethod
+    def __format_field(cls, name, text):
+        # Same line breaking as polib: split at newlines, otherwise wrap
+        # long strings at spaces
+        lines = text.splitlines(True)
+
+        if len(lines) > 1:
+            lines = [""] + lines
+        elif len(text) > cls.wrap_width - len(name) - 3 and len(text) > (
+            cls.wrap_width
+            - len(name)
+            - 3
+            + sum(text.count(char) for char in cls.__escape_chars)
+        ):
+            lines = [""] + [
+                cls.__unescape(line)
+                for line in textwrap.wrap(
+                    cls.__escape(text),
+                    cls.wrap_width - 2,
+                    drop_whitespace=False,
+                    break_long_words=False,
+                )
+            ]
+        else:
+            lines = [text]
+
+        return "\n".join(
+            [f'{name} "{cls.__escape(lines[0])}"']
+            + [f'"{cls.__escape(line)}"' for line in lines[1:]]
+        )
+
+    @staticmethod
+    def __escape(text):
+        return (
+            text.replace("\\", r"\\")
+            .replace("\t", r"\t")
+            .replace("\r", r"\r")
+            .replace("\n", r"\n")
+            .replace('"', r"\"")
+        )
+
+    @classmethod
+    def __unescape(cls, text):
+        if "\\\\" in text:
+            return cls.__escape_sequence.sub(
+                lambda match: cls.__unescapes[match[1]], text
+            )
+
+        # Without escaped backslashes every backslash starts an escape
+        return (
+            text.replace(r"\n", "\n")
+            .replace(r"\t", "\t")
+            .replace(r"\r", "\r")
+            .replace(r"\"", '"')
+        )
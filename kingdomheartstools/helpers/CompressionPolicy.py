@@ -0,0 +1,182 @@
+import logging
+import os
+import zlib
+
+# Faster deflate implementations are optional, stdlib zlib is the fallback
+try:
+    from zlib_ng import zlib_ng
+except ImportError:
+    zlib_ng = None
+
+try:
+    import deflate as libdeflate
+except ImportError:
+    libdeflate = None
+
+logger = logging.getLogger(__name__)
+
+
+class CompressionPolicy:
+    """Decide how assets are deflated when repacking.
+
+    ``backend`` is one of ``zlib``, ``zlib-ng``, ``libdeflate`` or ``auto``
+    (the fastest one installed). libdeflate has no streaming API, so it
+    buffers assets up to ``max_buffered`` bytes and larger ones are
+    compressed with zlib instead. With ``store_incompressible``, a few
+    samples of each file are deflated first and assets that would shrink
+    by less than ``min_saving`` are stored uncompressed (compressedLength
+    -1) instead.
+    """
+
+    backends = ["zlib-ng", "libdeflate", "zlib"]
+
+    strategies = {
+        "default": zlib.Z_DEFAULT_STRATEGY,
+        "filtered": zlib.Z_FILTERED,
+        "huffman": zlib.Z_HUFFMAN_ONLY,
+        "rle": zlib.Z_RLE,
+        "fixed": zlib.Z_FIXED,
+    }
+
+    sample_size = 0x10000
+    sample_count = 3
+
+    def __init__(
+        self,
+        level=-1,
+        strategy="default",
+        backend="auto",
+        store_incompressible=False,
+        min_saving=0.03,
+        max_buffered=0x4000000,
+    ):
+        if strategy not in self.strategies:
+            raise Exception(
+                f"Unknown compression strategy {strategy}, "
+                f"expected one of: {', '.join(self.strategies)}"
+            )
+
+        if not -1 <= level <= 9:
+            raise Exception(f"Compression level must be between -1 and 9, not {level}")
+
+        self.level = level
+        self.strategy = strategy
+        self.backend = self.__select_backend(backend)
+        self.store_incompressible = store_incompressible
+        self.min_saving = min_saving
+        self.max_buffered = max_buffered
+
+        if self.backend == "libdeflate" and strategy != "default":
+            logger.warning(f"libdeflate ignores the {strategy} strategy")
+
+        logger.debug(f"Using {self.backend} to compress assets")
+
+    @classmethod
+    def available_backends(cls):
+        return [backend for backend in cls.backends if cls.__is_installed(backend)]
+
+    @staticmethod
+    def __is_installed(backend):
+        return {"zlib-ng": zlib_ng, "libdeflate": libdeflate}.get(
+            backend, zlib
+        ) is not None
+
+    def __select_backend(self, backend):
+        if backend == "auto":
+            return self.available_backends()[0]
+
+        if backend not in self.backends:
+            raise Exception(
+                f"Unknown compression backend {backend}, "
+                f"expected one of: auto, {', '.join(self.backends)}"
+            )
+
+        if not self.__is_installed(backend):
+            logger.warning(f"{backend} is not installed, falling back to zlib")
+            return "zlib"
+
+        return backend
+
+    def compressobj(self):
+        """Return a compressor with the ``zlib.compressobj`` interface."""
+        if self.backend == "libdeflate":
+            return BufferedCompressor(self)
+
+        return self.zlib_compressobj()
+
+    def zlib_compressobj(self):
+        """Return a streaming compressor (zlib-ng if selected, else zlib)."""
+        module = zlib_ng if self.backend == "zlib-ng" else zlib
+
+        return module.compressobj(
+            self.level, zlib.DEFLATED, zlib.MAX_WBITS, 8, self.strategies[self.strategy]
+        )
+
+    def compress(self, data):
+        compressor = self.compressobj()
+        return compressor.compress(data) + compressor.flush()
+
+    def should_compress(self, path):
+        """Check whether deflating the file at ``path`` is worth it."""
+        if not self.store_incompressible:
+            return True
+
+        size = os.path.getsize(path)
+
+        if size == 0:
+            return True
+
+        # Sample the start, middle and end of the file at the fastest level,
+        # if those do not shrink the rest of the asset is unlikely to either
+        sample_length = 0
+        compressed_length = 0
+
+        with open(path, "rb") as f:
+            for i in range(self.sample_count):
+                f.seek(max(0, size - self.sample_size) * i // (self.sample_count - 1))
+                sample = f.read(self.sample_size)
+
+                sample_length += len(sample)
+                compressed_length += len(zlib.compress(sample, 1))
+
+                if size <= self.sample_size:
+                    break
+
+        return compressed_length <= sample_length * (1 - self.min_saving)
+
+
+class BufferedCompressor:
+    """Compressor for one-shot backends (libdeflate).
+
+    Input is collected until ``flush``. Once it grows past the policy's
+    ``max_buffered`` size it is handed to a streaming zlib compressor, so
+    memory stays bounded for large assets.
+    """
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.buffer = bytearray()
+        self.compressor = None
+
+    def compress(self, data):
+        if self.compressor is not None:
+            return self.compressor.compress(data)
+
+        self.buffer += data
+
+        if len(self.buffer) <= self.policy.max_buffered:
+            return b""
+
+        self.compressor = self.policy.zlib_compressobj()
+        data, self.buffer = self.buffer, None
+
+        return self.compressor.compress(data)
+
+    def flush(self):
+        if self.compressor is not None:
+            return self.compressor.flush()
+
+        # libdeflate levels go up to 12, but -1 means its default (6) too
+        level = 6 if self.policy.level == -1 else self.policy.level
+
+        return libdeflate.zlib_compress(self.buffer, level)
@@ -0,0 +1,44 @@
+from functools import lru_cache
+
+from .EGSEncryption import EGSEncryption
+
+
+class EGSCipher:
+    """In-place implementation of the EGS asset cipher.
+
+    Every round of ``EGSEncryption.decrypt_chunk`` XORs the same 16-byte
+    chunk with another slice of the expanded key, so all 11 rounds collapse
+    into a single 16-byte mask per seed. The cipher is a plain XOR, which
+    makes encryption and decryption the same operation.
+    """
+
+    encrypted_length = 0x100
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def get_mask(seed):
+        """Return the mask for the first 0x100 bytes as a little endian int."""
+        key = EGSEncryption.generate_key(seed)
+        mask = bytearray(0x10)
+
+        for i in range(EGSEncryption.pass_count + 1):
+            for j in range(0x10):
+                mask[j] ^= key[0x10 * i + j]
+
+        return int.from_bytes(bytes(mask) * 0x10, "little")
+
+    @staticmethod
+    def decrypt(seed, data):
+        """Decrypt ``data`` (a bytearray or writable memoryview) in place."""
+        view = memoryview(data)
+        length = min(len(view), EGSCipher.encrypted_length)
+
+        if length > 0:
+            mask = EGSCipher.get_mask(bytes(seed)) & ((1 << (length * 8)) - 1)
+            view[:length] = (int.from_bytes(view[:length], "little") ^ mask).to_bytes(
+                length, "little"
+            )
+
+        return data
+
+    encrypt = decrypt
@@ -0,0 +1,226 @@
+import glob
+import hashlib
+import logging
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from pathlib import Path
+
+from ..common.constants import languages, worlds
+from ..resources import path as resource_path
+
+logger = logging.getLogger(__name__)
+
+
+class FileMap:
+    """MD5 -> filename lookup backed by a prebuilt binary index.
+
+    The index is generated from the lists in ``resources/`` on first use and
+    regenerated whenever one of them changes. Layout (little endian)::
+
+        header   "KHFM", version (u32), fingerprint (20 bytes), count (u32)
+        digests  count * 16 bytes, sorted
+        offsets  (count + 1) * u32, start of each name in the string pool
+        pool     UTF-8 names
+    """
+
+    version = 1
+
+    __header = struct.Struct("<4sI20sI")
+    __signature = b"KHFM"
+    __index_name = "file_map.idx"
+
+    def __init__(self, index_path=None):
+        self.__index = None
+        self.__count = 0
+
+        self.index_path = (
+            Path(index_path) if index_path is not None else self.__default_path()
+        )
+
+        # A stale index in a read-only resources folder is rebuilt here
+        self.__fallback_path = (
+            self.__cache_path() if index_path is None else self.index_path
+        )
+
+    def get(self, md5, default=None):
+        if isinstance(md5, str):
+            md5 = bytes.fromhex(md5)
+
+        if self.__index is None:
+            self.__open()
+
+        position = bisect_left(self, md5)
+
+        if position < self.__count and self[position] == md5:
+            return self.__get_name(position)
+
+        return default
+
+    def __len__(self):
+        if self.__index is None:
+            self.__open()
+
+        return self.__count
+
+    def __getitem__(self, position):
+        start = self.__header.size + position * 0x10
+        return self.__index[start : start + 0x10]
+
+    def __get_name(self, position):
+        offsets_start = self.__header.size + self.__count * 0x10 + position * 4
+        start, end = struct.unpack_from("<2I", self.__index, offsets_start)
+
+        pool_start = self.__header.size + self.__count * 0x14 + 4
+        return self.__index[pool_start + start : pool_start + end].decode("utf-8")
+
+    def __default_path(self):
+        path = Path(resource_path) / self.__index_name
+
+        if os.access(resource_path, os.W_OK) or path.exists():
+            return path
+
+        return self.__cache_path()
+
+    def __cache_path(self):
+        return Path.home() / ".cache" / "kingdomheartstools" / self.__index_name
+
+    def __open(self):
+        fingerprint = self.__fingerprint()
+
+        if not self.__is_current(fingerprint) and not os.access(
+            self.index_path.parent, os.W_OK
+        ):
+            self.index_path = self.__fallback_path
+
+        if not self.__is_current(fingerprint):
+            logger.info("Building file map index...")
+            self.__build(fingerprint)
+
+        with open(self.index_path, "rb") as f:
+            self.__index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        _, _, _, self.__count = self.__header.unpack_from(self.__index)
+
+    def __fingerprint(self):
+        fingerprint = hashlib.sha1(str(self.version).encode())
+
+        for file in sorted(glob.glob(f"{resource_path}/*.txt")):
+            stat = os.stat(file)
+            fingerprint.update(
+                f"{os.path.basename(file)}:{stat.st_size}:{stat.st_mtime_ns}".encode()
+            )
+
+        return fingerprint.digest()
+
+    def __is_current(self, fingerprint):
+        try:
+            with open(self.index_path, "rb") as f:
+                header = f.read(self.__header.size)
+        except OSError:
+            return False
+
+        if len(header) != self.__header.size:
+            return False
+
+        signature, version, index_fingerprint, _ = self.__header.unpack(header)
+
+        return (
+            signature == self.__signature
+            and version == self.version
+            and index_fingerprint == fingerprint
+        )
+
+    def __build(self, fingerprint):
+        entries = sorted(self.__generate().items())
+
+        pool = bytearray()
+        offsets = [0]
+
+        for _, filename in entries:
+            pool += filename.encode("utf-8")
+            offsets.append(len(pool))
+
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+
+        with open(temp_path, "wb") as f:
+            f.write(
+                self.__header.pack(
+                    self.__signature, self.version, fingerprint, len(entries)
+                )
+            )
+            f.write(b"".join(md5 for md5, _ in entries))
+            f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+            f.write(pool)
+
+        os.replace(temp_path, self.index_path)
+
+    @staticmethod
+    def __generate():
+        file_map = {}
+
+        for language in languages:
+            for world in worlds:
+                for index in range(64):
+                    ard_filename = os.path.join(
+                        "ard/", language, f"{world}{index:02d}.ard"
+                    ).replace("\\", "/")
+                    map_filename = os.path.join(
+                        "map", language, f"{world}{index:02d}.map"
+                    ).replace("\\", "/")
+                    bar_filename = os.path.join(
+                        "map", language, f"{world}{index:02d}.bar"
+                    ).replace("\\", "/")
+
+                    file_map[hashlib.md5(ard_filename.encode()).digest()] = ard_filename
+                    file_map[hashlib.md5(map_filename.encode()).digest()] = map_filename
+                    file_map[hashlib.md5(bar_filename.encode()).digest()] = bar_filename
+
+        for additional_file in [
+            "item-011.imd",
+            "KH2.IDX",
+            "ICON/ICON0.PNG",
+            "ICON/ICON0_EN.png",
+        ]:
+            md5 = hashlib.md5(additional_file.encode()).digest()
+            file_map[md5] = additional_file.strip()
+
+        for file in glob.glob(f"{resource_path}/*.txt"):
+            with open(file, "r", encoding="utf-8") as f:
+                file_list = f.readlines()
+
+                for file_name in file_list:
+                    additional_files = []
+                    filename = file_name.strip()
+
+                    if filename.find("anm/") != -1:
+                        additional_files.append(filename.replace("anm/", "anm/jp/"))
+                        additional_files.append(filename.replace("anm/", "anm/us/"))
+                        additional_files.append(filename.replace("anm/", "anm/fm/"))
+
+                    if filename.find("bgm/") != -1:
+                        additional_files.append(filename.replace(".bgm", ".win32.scd"))
+
+                    if filename.find("se/") != -1:
+                        additional_files.append(filename.replace(".seb", ".win32.scd"))
+
+                    if filename.find("vagstream/") != -1:
+                        additional_files.append(filename.replace(".vas", ".win32.scd"))
+
+                    if filename.find("gumibattle/se/") != -1:
+                        additional_files.append(filename.replace(".seb", ".win32.scd"))
+
+                    if filename.find("voice/") != -1:
+                        additional_files.append(filename.replace(".vag", ".win32.scd"))
+                        additional_files.append(filename.replace(".vsb", ".win32.scd"))
+
+                    md5 = hashlib.md5(filename.encode()).digest()
+                    file_map[md5] = filename
+
+                    for additional_file in additional_files:
+                        md5 = hashlib.md5(additional_file.encode()).digest()
+                        file_map[md5] = additional_file
+
+        return file_map
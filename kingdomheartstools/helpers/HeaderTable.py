@@ -0,0 +1,90 @@
+import sys
+from array import array
+
+from ..common.HeaderEntry import HeaderEntry
+
+
+class HeaderTable:
+    """Column-oriented view of a .hed file.
+
+    The header is loaded with a single read and split into ``array`` columns
+    (``offset``, ``dataLength``, ``actualLength``), while the MD5 hashes stay
+    in the raw buffer. ``HeaderEntry`` objects are only built when an entry
+    is indexed.
+    """
+
+    entry_size = 0x20
+
+    def __init__(self, data):
+        if len(data) % self.entry_size != 0:
+            raise ValueError(
+                "Header length does not match, something is wrong with the archive"
+            )
+
+        self.data = bytes(data)
+
+        # Each entry is md5 (16 bytes), offset (u64), dataLength and
+        # actualLength (u32), so the columns are strided slices of the buffer
+        words = array("Q", self.data)
+        lengths = array("I", self.data)
+
+        if sys.byteorder != "little":
+            words.byteswap()
+            lengths.byteswap()
+
+        self.offset = words[2::4]
+        self.dataLength = lengths[6::8]
+        self.actualLength = lengths[7::8]
+
+        self.__positions = None
+
+    @classmethod
+    def read(cls, path):
+        with open(path, "rb") as f:
+            return cls(f.read())
+
+    def __len__(self):
+        return len(self.offset)
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += len(self)
+
+        return HeaderEntry(
+            md5=self.get_md5(position).hex(),
+            offset=self.offset[position],
+            dataLength=self.dataLength[position],
+            actualLength=self.actualLength[position],
+        )
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+    def get_md5(self, position):
+        start = position * self.entry_size
+        return self.data[start : start + 0x10]
+
+    def find(self, md5):
+        """Return the position of an entry by MD5 (hex string or digest)."""
+        if isinstance(md5, str):
+            md5 = bytes.fromhex(md5)
+
+        if self.__positions is None:
+            self.__positions = {
+                self.get_md5(position): position for position in range(len(self))
+            }
+
+        return self.__positions.get(md5)
+
+    def argsort(self, column="offset"):
+        """Return entry positions ordered by one of the integer columns."""
+        return sorted(range(len(self)), key=getattr(self, column).__getitem__)
+
+    def where(self, column, predicate):
+        """Return positions of entries whose ``column`` value matches."""
+        return [
+            position
+            for position, value in enumerate(getattr(self, column))
+            if predicate(value)
+        ]
@@ -0,0 +1,218 @@
+import mmap
+import os
+import struct
+import zlib
+from datetime import datetime
+
+from ..common.AssetHeader import AssetHeader
+from ..common.RemasteredEntry import RemasteredEntry
+from .EGSCipher import EGSCipher
+
+
+class PackageReader:
+    """Read-only, memory-mapped view of a .pkg file.
+
+    Asset data is handed out as ``memoryview`` slices of the mapping, so
+    nothing is copied until a consumer actually needs to modify the bytes.
+    """
+
+    __asset_header = struct.Struct("<IIiI")
+    __remastered_entry = struct.Struct("<32sIIIi")
+
+    def __init__(self, path):
+        self.path = path
+        self.__file = open(path, "rb")
+
+        if os.fstat(self.__file.fileno()).st_size > 0:
+            self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.__map)
+        else:
+            self.__map = None
+            self.view = memoryview(b"")
+
+    def __len__(self):
+        return len(self.view)
+
+    def close(self):
+        self.view.release()
+
+        if self.__map is not None:
+            self.__map.close()
+
+        self.__file.close()
+
+    def read_asset(self, offset):
+        """Parse the asset record at ``offset``.
+
+        Returns the raw 0x10-byte header (the encryption seed) and a list of
+        ``(header, data_offset)`` blocks: the asset itself, followed by its
+        remastered assets.
+        """
+        header_raw_bytes = bytes(self.view[offset : offset + 0x10])
+
+        (
+            decompressed_length,
+            remastered_asset_count,
+            compressed_length,
+            creation_date,
+        ) = self.__asset_header.unpack(header_raw_bytes)
+
+        asset_header = AssetHeader(
+            decompressedLength=decompressed_length,
+            remasteredAssetCount=remastered_asset_count,
+            compressedLength=compressed_length,
+            creationDate=datetime.fromtimestamp(creation_date),
+        )
+
+        position = offset + 0x10
+        remastered_assets_headers = []
+
+        for _ in range(asset_header.remasteredAssetCount):
+            (
+                name,
+                remastered_offset,
+                original_asset_offset,
+                decompressed_length,
+                compressed_length,
+            ) = self.__remastered_entry.unpack_from(self.view, position)
+
+            remastered_assets_headers.append(
+                RemasteredEntry(
+                    name=name.decode("utf-8").strip("\0"),
+                    offset=remastered_offset,
+                    originalAssetOffset=original_asset_offset,
+                    decompressedLength=decompressed_length,
+                    compressedLength=compressed_length,
+                )
+            )
+
+            position += self.__remastered_entry.size
+
+        blocks = [(asset_header, position)]
+        position += self.get_data_length(asset_header)
+
+        for remastered_asset_header in remastered_assets_headers:
+            if position % 0x10 != 0:
+                position += 0x10 - (position % 0x10)
+
+            blocks.append((remastered_asset_header, position))
+            position += self.get_data_length(remastered_asset_header)
+
+        return header_raw_bytes, blocks
+
+    def get_data(self, header, offset):
+        """Return the stored (possibly encrypted/compressed) bytes of a block."""
+        return self.view[offset : offset + self.get_data_length(header)]
+
+    def iter_data(self, seed, header, offset, buffer_size=0x100000, stored_hash=None):
+        """Yield the decrypted and decompressed contents of a block.
+
+        Compressed blocks are fed through ``zlib.decompressobj`` so that no
+        more than ``buffer_size`` bytes of input or output are held at once.
+        When given, ``stored_hash`` is updated with the stored bytes as they
+        are consumed.
+        """
+        packet_data = self.get_data(header, offset)
+
+        if header.compressedLength > -2:
+            encrypted_data = EGSCipher.decrypt(
+                seed, bytearray(packet_data[: EGSCipher.encrypted_length])
+            )
+            chunks = [encrypted_data, packet_data[len(encrypted_data) :]]
+        else:
+            chunks = [packet_data]
+
+        position = 0
+
+        if header.compressedLength < 0:
+            for chunk in chunks:
+                if stored_hash is not None:
+                    stored_hash.update(packet_data[position : position + len(chunk)])
+                    position += len(chunk)
+
+                if len(chunk) > 0:
+                    yield chunk
+
+            return
+
+        decompressor = zlib.decompressobj()
+
+        for chunk in chunks:
+            for start in range(0, len(chunk), buffer_size):
+                data = chunk[start : start + buffer_size]
+
+                if stored_hash is not None:
+                    stored_hash.update(packet_data[position : position + len(data)])
+                    position += len(data)
+
+                while data and not decompressor.eof:
+                    decompressed_data = decompressor.decompress(data, buffer_size)
+
+                    if decompressed_data:
+                        yield decompressed_data
+
+                    data = decompressor.unconsumed_tail
+
+        decompressed_data = decompressor.flush()
+
+        if decompressed_data:
+            yield decompressed_data
+
+        if not decompressor.eof:
+            raise zlib.error(
+                "Error -5 while decompressing data: incomplete or truncated stream"
+            )
+
+    def copy_to(self, target, offset, length):
+        """Copy ``length`` raw bytes at ``offset`` to the end of ``target``.
+
+        The kernel does the copy where copy_file_range/sendfile are
+        available, otherwise the bytes are written from the mapping.
+        """
+        target.flush()
+        target_offset = target.tell()
+        copied = 0
+
+        if offset + length > len(self.view):
+            raise Exception(
+                f"Cannot copy {length} bytes at {offset}, the package is truncated"
+            )
+
+        for copy_function in [self.__copy_file_range, self.__sendfile]:
+            try:
+                while copied < length:
+                    count = copy_function(
+                        target, offset + copied, target_offset + copied, length - copied
+                    )
+
+                    if count == 0:
+                        break
+
+                    copied += count
+            except (AttributeError, OSError):
+                continue
+
+            if copied == length:
+                break
+
+        target.seek(target_offset + copied)
+
+        if copied < length:
+            target.write(self.view[offset + copied : offset + length])
+
+    def __copy_file_range(self, target, offset, target_offset, count):
+        return os.copy_file_range(
+            self.__file.fileno(), target.fileno(), count, offset, target_offset
+        )
+
+    def __sendfile(self, target, offset, target_offset, count):
+        target.seek(target_offset)
+        return os.sendfile(target.fileno(), self.__file.fileno(), offset, count)
+
+    @staticmethod
+    def get_data_length(header):
+        return (
+            header.compressedLength
+            if header.compressedLength >= 0
+            else header.decompressedLength
+        )
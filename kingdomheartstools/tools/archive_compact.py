@@ -0,0 +1,66 @@
+import logging
+import os
+from pathlib import Path
+
+from kingdomheartstools.helpers.HeaderTable import HeaderTable
+from kingdomheartstools.helpers.PackageReader import PackageReader
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveCompact:
+    """Rewrite an archive without the dead space left by ``ArchivePatch``.
+
+    Live records are streamed to a new package in offset order and the .hed
+    entries are updated to match. Entries sharing a record keep sharing it.
+    """
+
+    def __init__(self, archive_path):
+        self.header_path = Path(archive_path).with_suffix(".hed")
+        self.package_path = Path(archive_path).with_suffix(".pkg")
+
+    def compact(self):
+        header = HeaderTable.read(self.header_path)
+        package = PackageReader(self.package_path)
+
+        header_temp_path = self.header_path.with_suffix(".hed.tmp")
+        package_temp_path = self.package_path.with_suffix(".pkg.tmp")
+
+        offsets = {}
+
+        with open(package_temp_path, "wb") as package_file:
+            for position in header.argsort("offset"):
+                entry = header[position]
+                record = (entry.offset, entry.dataLength)
+
+                if record not in offsets:
+                    offsets[record] = package_file.tell()
+                    package.copy_to(package_file, entry.offset, entry.dataLength)
+
+                    # Keep records aligned like ArchiveRepack writes them
+                    if package_file.tell() % 0x10 != 0:
+                        package_file.write(
+                            b"\x00" * (0x10 - package_file.tell() % 0x10)
+                        )
+
+            new_length = package_file.tell()
+
+        with open(header_temp_path, "wb") as header_file:
+            for entry in header:
+                header_file.write(bytes.fromhex(entry.md5))
+                header_file.write(
+                    int.to_bytes(offsets[(entry.offset, entry.dataLength)], 8, "little")
+                )
+                header_file.write(int.to_bytes(entry.dataLength, 4, "little"))
+                header_file.write(int.to_bytes(entry.actualLength, 4, "little"))
+
+        old_length = len(package)
+        package.close()
+
+        os.replace(package_temp_path, self.package_path)
+        os.replace(header_temp_path, self.header_path)
+
+        logger.info(
+            f"Reclaimed {old_length - new_length} bytes "
+            f"({old_length} -> {new_length})"
+        )
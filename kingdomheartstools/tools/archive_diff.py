@@ -0,0 +1,114 @@
+import json
+import logging
+from pathlib import Path
+
+from kingdomheartstools.helpers.FileMap import FileMap
+from kingdomheartstools.helpers.HeaderTable import HeaderTable
+from kingdomheartstools.helpers.PackageReader import PackageReader
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveDiff:
+    """Compare two versions of an archive entry by entry.
+
+    Entries are joined by MD5. Entries whose lengths differ are modified,
+    and only entries with matching lengths have their stored bytes compared,
+    so nothing is ever decompressed.
+    """
+
+    def __init__(self, old_path, new_path):
+        self.old_header = HeaderTable.read(Path(old_path).with_suffix(".hed"))
+        self.new_header = HeaderTable.read(Path(new_path).with_suffix(".hed"))
+        self.old_package = PackageReader(Path(old_path).with_suffix(".pkg"))
+        self.new_package = PackageReader(Path(new_path).with_suffix(".pkg"))
+        self.file_map = FileMap()
+
+    def diff(self):
+        old_positions = {
+            self.old_header.get_md5(position): position
+            for position in range(len(self.old_header))
+        }
+
+        added = []
+        modified = []
+        unchanged = 0
+
+        for new_position in range(len(self.new_header)):
+            md5 = self.new_header.get_md5(new_position)
+            old_position = old_positions.pop(md5, None)
+
+            if old_position is None:
+                added.append(self.__describe(md5, new=new_position))
+            elif self.__is_modified(old_position, new_position):
+                modified.append(self.__describe(md5, old_position, new_position))
+            else:
+                unchanged += 1
+
+        removed = [
+            self.__describe(md5, old=old_position)
+            for md5, old_position in old_positions.items()
+        ]
+
+        return {
+            "added": added,
+            "removed": removed,
+            "modified": modified,
+            "unchanged": unchanged,
+        }
+
+    def to_json(self):
+        return json.dumps(self.diff(), indent=4)
+
+    def to_table(self):
+        result = self.diff()
+        lines = []
+
+        for status, symbol in [("added", "+"), ("removed", "-"), ("modified", "M")]:
+            for entry in result[status]:
+                lines.append(f"{symbol} {entry['name']}")
+
+        lines.append(
+            f"{len(result['added'])} added, {len(result['removed'])} removed, "
+            f"{len(result['modified'])} modified, {result['unchanged']} unchanged"
+        )
+
+        return "\n".join(lines)
+
+    def __is_modified(self, old_position, new_position):
+        old, new = self.old_header, self.new_header
+        length = old.dataLength[old_position]
+
+        if (
+            length != new.dataLength[new_position]
+            or old.actualLength[old_position] != new.actualLength[new_position]
+        ):
+            return True
+
+        old_offset = old.offset[old_position]
+        new_offset = new.offset[new_position]
+
+        # Comparing the mapped bytes directly is cheaper than hashing both
+        return (
+            self.old_package.view[old_offset : old_offset + length]
+            != self.new_package.view[new_offset : new_offset + length]
+        )
+
+    def __describe(self, md5, old=None, new=None):
+        info = {
+            "name": self.file_map.get(md5, f"{md5.hex()}.raw"),
+            "md5": md5.hex(),
+        }
+
+        for key, header, position in [
+            ("old", self.old_header, old),
+            ("new", self.new_header, new),
+        ]:
+            if position is not None:
+                info[key] = {
+                    "offset": header.offset[position],
+                    "dataLength": header.dataLength[position],
+                    "actualLength": header.actualLength[position],
+                }
+
+        return info
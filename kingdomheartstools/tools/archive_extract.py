@@ -1,244 +1,484 @@
-import glob
 import hashlib
 import json
 import logging
 import os
+import re
+import shutil
 import sys
-import zlib
-from datetime import datetime
-from io import BytesIO
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
 from pathlib import Path
 
 import filedate
 
-from kingdomheartstools.common.RemasteredEntry import RemasteredEntry
-from kingdomheartstools.helpers.EGSEncryption import EGSEncryption
-
-from ..common.AssetHeader import AssetHeader
-from ..common.constants import languages, worlds
-from ..common.HeaderEntry import HeaderEntry
-from ..resources import path as resource_path
+from kingdomheartstools.helpers.FileMap import FileMap
+from kingdomheartstools.helpers.HeaderTable import HeaderTable
+from kingdomheartstools.helpers.PackageReader import PackageReader
 
 logger = logging.getLogger(__name__)
 
 
 class ArchiveExtract:
-    def __init__(self, input_path, output_path):
-        self.__file_map = {}
+    manifest_name = "manifest.json"
+    manifest_version = 1
+
+    def __init__(self, input_path, output_path=None, buffer_size=0x100000):
+        self.__file_map = FileMap()
         self.__file_list = {}
+        self.__names = []
+        self.__stats_lock = threading.Lock()
 
-        self.package = open(Path(input_path).with_suffix(".pkg"), "rb")
+        self.package = PackageReader(Path(input_path).with_suffix(".pkg"))
         self.output_path = output_path
+        self.buffer_size = buffer_size
+        self.hash_content = False
+        self.sidecars = True
 
-        self.__load_file_map()
         self.__read_header(Path(input_path).with_suffix(".hed"))
 
-    def __load_file_map(self):
-        for language in languages:
-            for world in worlds:
-                for index in range(64):
-                    ard_filename = os.path.join(
-                        "ard/", language, f"{world}{index:02d}.ard"
-                    ).replace("\\", "/")
-                    map_filename = os.path.join(
-                        "map", language, f"{world}{index:02d}.map"
-                    ).replace("\\", "/")
-                    bar_filename = os.path.join(
-                        "map", language, f"{world}{index:02d}.bar"
-                    ).replace("\\", "/")
-
-                    self.__file_map[
-                        hashlib.md5(ard_filename.encode()).hexdigest()
-                    ] = ard_filename
-                    self.__file_map[
-                        hashlib.md5(map_filename.encode()).hexdigest()
-                    ] = map_filename
-                    self.__file_map[
-                        hashlib.md5(bar_filename.encode()).hexdigest()
-                    ] = bar_filename
-
-        for additional_file in [
-            "item-011.imd",
-            "KH2.IDX",
-            "ICON/ICON0.PNG",
-            "ICON/ICON0_EN.png",
-        ]:
-            md5 = hashlib.md5(additional_file.encode()).hexdigest()
-            self.__file_map[md5] = additional_file.strip()
-
-        for file in glob.glob(f"{resource_path}/*.txt"):
-            with open(file, "r", encoding="utf-8") as f:
-                file_list = f.readlines()
-
-                for file_name in file_list:
-                    additional_files = []
-                    filename = file_name.strip()
-
-                    if filename.find("anm/") != -1:
-                        additional_files.append(filename.replace("anm/", "anm/jp/"))
-                        additional_files.append(filename.replace("anm/", "anm/us/"))
-                        additional_files.append(filename.replace("anm/", "anm/fm/"))
-
-                    if filename.find("bgm/") != -1:
-                        additional_files.append(filename.replace(".bgm", ".win32.scd"))
-
-                    if filename.find("se/") != -1:
-                        additional_files.append(filename.replace(".seb", ".win32.scd"))
-
-                    if filename.find("vagstream/") != -1:
-                        additional_files.append(filename.replace(".vas", ".win32.scd"))
-
-                    if filename.find("gumibattle/se/") != -1:
-                        additional_files.append(filename.replace(".seb", ".win32.scd"))
-
-                    if filename.find("voice/") != -1:
-                        additional_files.append(filename.replace(".vag", ".win32.scd"))
-                        additional_files.append(filename.replace(".vsb", ".win32.scd"))
-
-                    md5 = hashlib.md5(filename.encode()).hexdigest()
-                    self.__file_map[md5] = filename
-
-                    for additional_file in additional_files:
-                        md5 = hashlib.md5(additional_file.encode()).hexdigest()
-                        self.__file_map[md5] = additional_file
-
     def __read_header(self, header_path):
-        header_length = os.stat(header_path).st_size
-        entries_count = int(header_length / 0x20)
+        try:
+            self.header = HeaderTable.read(header_path)
+        except ValueError:
+            logger.error(
+                "Header length does not match, something is wrong with the archive, exiting..."
+            )
+            sys.exit(1)
+
+        for position in range(len(self.header)):
+            md5 = self.header.get_md5(position)
+            filename = self.__file_map.get(md5, f"{md5.hex()}.raw")
+
+            self.__file_list[filename] = position
+            self.__names.append(filename)
+
+    def get_entry(self, filename):
+        position = self.__file_list.get(filename)
+        return self.header[position] if position is not None else None
+
+    def __get_name(self, md5):
+        try:
+            position = self.header.find(md5)
+        except ValueError:
+            return None
+
+        return self.__names[position] if position is not None else None
+
+    def select(self, include=None, exclude=None, regex=None, md5=None):
+        """Return the names of entries matching the given filters.
+
+        An entry is selected when it matches any of the ``include`` globs,
+        ``regex`` patterns or ``md5`` hashes (everything is selected when none
+        are given) and none of the ``exclude`` globs.
+        """
+        include = include or []
+        exclude = exclude or []
+        regex = [re.compile(pattern) for pattern in regex or []]
+        md5 = [md5_hash.lower() for md5_hash in md5 or []]
+
+        if include or regex or md5:
+            selected = [
+                self.__get_name(md5_hash)
+                for md5_hash in md5
+                if self.__get_name(md5_hash) is not None
+            ]
+            selected += [
+                filename
+                for filename in self.__file_list
+                if any(fnmatchcase(filename, pattern) for pattern in include)
+                or any(pattern.search(filename) for pattern in regex)
+            ]
+        else:
+            selected = list(self.__file_list)
 
-        file_list_out = {}
+        selected = set(
+            filename
+            for filename in selected
+            if not any(fnmatchcase(filename, pattern) for pattern in exclude)
+        )
 
-        with open(header_path, "rb") as header:
-            for _ in range(entries_count):
-                md5 = header.read(0x10).hex()
-                filename = self.__file_map.get(md5, f"{md5}.raw")
+        # Keep header order so the output does not depend on the filters
+        return [filename for filename in self.__file_list if filename in selected]
 
-                entry = HeaderEntry(
-                    md5=md5,
-                    offset=int.from_bytes(header.read(0x8), "little"),
-                    dataLength=int.from_bytes(header.read(0x4), "little"),
-                    actualLength=int.from_bytes(header.read(0x4), "little"),
-                )
+    def open(self, name):
+        """Return the contents of a single asset without extracting anything else.
 
-                self.__file_list[filename] = entry
-                file_list_out[filename] = entry.md5
+        ``name`` is a path as listed in file_list.json, an MD5 hash, or the
+        path of a remastered asset as laid out by ``extract``
+        (``<dir>/remastered_<file>/<name>``).
+        """
+        name = self.__get_name(name) or name
+        entry = self.get_entry(name)
+        remastered_name = None
 
-            if header_length != header.tell():
-                logger.error(
-                    "Header length does not match, something is wrong with the archive, exiting..."
-                )
-                sys.exit(1)
+        if entry is None:
+            parts = Path(name).parts
 
-            Path(self.output_path).mkdir(parents=True, exist_ok=True)
+            for i, part in enumerate(parts):
+                if not part.startswith("remastered_"):
+                    continue
 
-            with open(f"{self.output_path}/file_list.json", "w", encoding="utf-8") as f:
-                json.dump(file_list_out, f)
+                parent = "/".join(parts[:i] + (part[len("remastered_") :],))
 
-    def extract(self):
-        for filename, entry in self.__file_list.items():
-            # Create the output directory if it doesn't exist
-            output_dir = Path(self.output_path) / Path(filename).parent
-            output_dir.mkdir(parents=True, exist_ok=True)
+                if parent in self.__file_list:
+                    entry = self.get_entry(parent)
+                    remastered_name = "/".join(parts[i + 1 :])
+                    break
 
-            logger.info(f"Extracting {filename}...")
-            output_path = Path(self.output_path) / filename
+        if entry is None:
+            raise FileNotFoundError(name)
 
-            self.__extract_asset(output_path, entry)
+        encryption_key, blocks = self.package.read_asset(entry.offset)
 
-    def __extract_asset(self, filepath, entry):
-        self.package.seek(entry.offset)
-
-        header_raw_bytes = self.package.read(0x10)
-        header_raw = BytesIO(header_raw_bytes)
-
-        encryption_key = EGSEncryption.generate_key(header_raw_bytes)
-
-        asset_header = AssetHeader(
-            decompressedLength=int.from_bytes(header_raw.read(0x4), "little"),
-            remasteredAssetCount=int.from_bytes(header_raw.read(0x4), "little"),
-            compressedLength=int.from_bytes(
-                header_raw.read(0x4), "little", signed=True
-            ),
-            creationDate=datetime.fromtimestamp(
-                int.from_bytes(header_raw.read(0x4), "little")
-            ),
+        if remastered_name is None:
+            header, data_offset = blocks[0]
+        else:
+            for header, data_offset in blocks[1:]:
+                if header.name == remastered_name:
+                    break
+            else:
+                raise FileNotFoundError(name)
+
+        return b"".join(self.__get_asset_data(header, encryption_key, data_offset))
+
+    def extract(
+        self,
+        jobs=1,
+        include=None,
+        exclude=None,
+        regex=None,
+        md5=None,
+        incremental=False,
+        delete_removed=False,
+        hash_content=False,
+        sidecars=True,
+    ):
+        """Extract the selected entries and record them in manifest.json.
+
+        file_list.json always lists every entry of the archive, the manifest
+        keeps the records of the entries extracted by this and earlier runs.
+
+        With ``incremental`` set, entries whose header entry (or stored bytes,
+        if only the offset moved), asset timestamp and output size match the
+        previous manifest are skipped. Entries that are no longer in the
+        archive are flagged, or deleted when ``delete_removed`` is set.
+        ``hash_content`` stores a SHA-1 of every extracted file in the
+        manifest.
+
+        The encrypt/compress flags of every entry are kept in the manifest,
+        ``<file>.json`` sidecars with the same flags are only written when
+        ``sidecars`` is set (the layout older versions used).
+        """
+        self.__worker_stats = {}
+        self.hash_content = hash_content
+        self.sidecars = sidecars
+
+        file_list = {
+            filename: self.get_entry(filename)
+            for filename in self.select(include, exclude, regex, md5)
+        }
+
+        Path(self.output_path).mkdir(parents=True, exist_ok=True)
+
+        # file_list.json always lists the whole archive, repack and patch walk
+        # it. What was actually extracted is tracked in the manifest.
+        with open(f"{self.output_path}/file_list.json", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    filename: self.header[position].md5
+                    for filename, position in self.__file_list.items()
+                },
+                f,
+            )
+
+        # Records of entries extracted by earlier runs (e.g. with other
+        # filters) are kept, so the manifest covers every extracted file
+        manifest = self.read_manifest(self.output_path)
+        records = {}
+
+        if incremental:
+            for filename, entry in list(file_list.items()):
+                record = manifest.get(filename)
+
+                if record is not None and self.__is_unchanged(filename, entry, record):
+                    records[filename] = {**record, "offset": entry.offset}
+                    del file_list[filename]
+
+            logger.info(
+                f"{len(file_list)} new or changed entries, {len(records)} unchanged"
+            )
+
+        if jobs > 1:
+            # zlib and file writes release the GIL, so threads sharing the
+            # read-only mapping are enough to keep every core busy.
+            with ThreadPoolExecutor(
+                max_workers=jobs, thread_name_prefix="extract"
+            ) as executor:
+                futures = {
+                    filename: executor.submit(self.__extract_entry, filename, entry)
+                    for filename, entry in file_list.items()
+                }
+
+                for filename, future in futures.items():
+                    records[filename] = future.result()
+
+            self.__report_worker_stats()
+        else:
+            for filename, entry in file_list.items():
+                records[filename] = self.__extract_entry(filename, entry)
+
+        entries = {
+            filename: records.get(filename, manifest.get(filename))
+            for filename in self.__file_list
+            if filename in records or filename in manifest
+        }
+
+        for filename, record in manifest.items():
+            if filename not in self.__file_list and not self.__remove_entry(
+                filename, delete_removed
+            ):
+                # Keep flagging it until it is deleted
+                entries[filename] = {**record, "removed": True}
+
+        self.__write_manifest(entries)
+
+    @staticmethod
+    def read_manifest(path):
+        """Return the entries of the manifest.json in an extracted folder."""
+        try:
+            with open(
+                Path(path) / ArchiveExtract.manifest_name, "r", encoding="utf-8"
+            ) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {}
+
+        if manifest.get("version") != ArchiveExtract.manifest_version:
+            logger.warning("Unsupported manifest version, ignoring it...")
+            return {}
+
+        return manifest["entries"]
+
+    def __write_manifest(self, entries):
+        with open(
+            Path(self.output_path) / self.manifest_name, "w", encoding="utf-8"
+        ) as f:
+            json.dump({"version": self.manifest_version, "entries": entries}, f)
+
+    def __is_unchanged(self, filename, entry, record):
+        if (
+            record.get("removed")
+            or "encrypt" not in record
+            or record["md5"] != entry.md5
+            or record["dataLength"] != entry.dataLength
+            or record["actualLength"] != entry.actualLength
+        ):
+            return False
+
+        _, blocks = self.package.read_asset(entry.offset)
+
+        if int(blocks[0][0].creationDate.timestamp()) != record["timestamp"]:
+            return False
+
+        # Patches usually shift every following asset, so a moved entry is
+        # only re-extracted when its stored bytes differ
+        if record["offset"] != entry.offset and record.get(
+            "storedSha1"
+        ) != self.__get_stored_hash(entry):
+            return False
+
+        filepath = Path(self.output_path) / filename
+
+        if self.sidecars and not Path(f"{filepath}.json").exists():
+            return False
+
+        try:
+            return os.stat(filepath).st_size == record["size"]
+        except FileNotFoundError:
+            return False
+
+    def __remove_entry(self, filename, delete_removed):
+        filepath = Path(self.output_path) / filename
+
+        if not delete_removed:
+            logger.warning(f"{filename} is no longer in the archive")
+            return False
+
+        logger.info(f"Removing {filename}...")
+
+        for path in [filepath, Path(f"{filepath}.json")]:
+            path.unlink(missing_ok=True)
+
+        shutil.rmtree(
+            filepath.parent / f"remastered_{filepath.name}", ignore_errors=True
         )
 
-        remastered_assets_headers = []
-
-        for i in range(asset_header.remasteredAssetCount):
-            remastered_assets_headers.append(
-                RemasteredEntry(
-                    name=self.package.read(0x20).decode("utf-8").strip("\0"),
-                    offset=int.from_bytes(self.package.read(4), "little"),
-                    originalAssetOffset=int.from_bytes(self.package.read(4), "little"),
-                    decompressedLength=int.from_bytes(self.package.read(4), "little"),
-                    compressedLength=int.from_bytes(
-                        self.package.read(4), "little", signed=True
-                    ),
+        return True
+
+    def __get_stored_hash(self, entry):
+        return hashlib.sha1(
+            self.package.view[entry.offset : entry.offset + entry.dataLength]
+        ).hexdigest()
+
+    def __extract_entry(self, filename, entry):
+        start_time = time.perf_counter()
+
+        # Create the output directory if it doesn't exist
+        output_dir = Path(self.output_path) / Path(filename).parent
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        logger.info(f"Extracting {filename}...")
+        output_path = Path(self.output_path) / filename
+
+        record = self.__extract_asset(output_path, entry)
+
+        with self.__stats_lock:
+            stats = self.__worker_stats.setdefault(
+                threading.current_thread().name, [0, 0, 0.0]
+            )
+            stats[0] += 1
+            stats[1] += record["size"] + sum(
+                remastered["size"] for remastered in record["remastered"].values()
+            )
+            stats[2] += time.perf_counter() - start_time
+
+        return record
+
+    def __report_worker_stats(self):
+        for worker, (assets, written, elapsed) in sorted(self.__worker_stats.items()):
+            logger.info(
+                "%s: %d assets, %.2f MB in %.2fs (%.2f MB/s)"
+                % (
+                    worker,
+                    assets,
+                    written / 0x100000,
+                    elapsed,
+                    written / 0x100000 / elapsed if elapsed > 0 else 0,
                 )
             )
 
+    def __extract_asset(self, filepath, entry):
+        encryption_key, blocks = self.package.read_asset(entry.offset)
+
+        asset_header, data_offset = blocks[0]
+
+        # Lets incremental runs tell a moved entry from a changed one. The
+        # stored bytes are hashed as they are streamed, starting with the
+        # header and the remastered table
+        stored_hash = hashlib.sha1(self.package.view[entry.offset : data_offset])
+
         with open(filepath, "wb") as writer:
             filedate.File(filepath).set(created=asset_header.creationDate)
-            writer.write(self.__get_asset_data(asset_header, encryption_key))
 
-            with open(f"{filepath}.json", "w", encoding="utf-8") as f:
-                file_config = {
-                    "encrypt": asset_header.compressedLength > -2,
-                    "compress": asset_header.compressedLength > -1,
-                }
+            content_hash = self.__write_asset_data(
+                writer, asset_header, encryption_key, data_offset, stored_hash
+            )
+
+        position = data_offset + self.package.get_data_length(asset_header)
+
+        file_config = {
+            "encrypt": asset_header.compressedLength > -2,
+            "compress": asset_header.compressedLength > -1,
+        }
 
+        if self.sidecars:
+            with open(f"{filepath}.json", "w", encoding="utf-8") as f:
                 json.dump(file_config, f)
 
+        record = {
+            "md5": entry.md5,
+            "offset": entry.offset,
+            "dataLength": entry.dataLength,
+            "actualLength": entry.actualLength,
+            "timestamp": int(asset_header.creationDate.timestamp()),
+            **file_config,
+            **self.__get_file_record(filepath, content_hash),
+            "remastered": {},
+        }
+
         remastered_folder = os.path.join(
             os.path.dirname(filepath), "remastered_" + os.path.basename(filepath)
         )
         remastered_folder = Path(remastered_folder)
 
-        for remastered_asset_header in remastered_assets_headers:
+        for remastered_asset_header, data_offset in blocks[1:]:
             logger.info(
                 f"Extracting remastered asset {remastered_asset_header.name}..."
             )
 
-            if self.package.tell() % 0x10 != 0:
-                self.package.seek(0x10 - (self.package.tell() % 0x10), 1)
+            remastered_path = remastered_folder / remastered_asset_header.name
+            remastered_path.parent.mkdir(parents=True, exist_ok=True)
 
-            Path(remastered_folder / remastered_asset_header.name).parent.mkdir(
-                parents=True, exist_ok=True
-            )
-            with open(remastered_folder / remastered_asset_header.name, "wb") as writer:
-                writer.write(
-                    self.__get_asset_data(remastered_asset_header, encryption_key)
+            # Alignment padding before the block
+            stored_hash.update(self.package.view[position:data_offset])
+
+            with open(remastered_path, "wb") as writer:
+                content_hash = self.__write_asset_data(
+                    writer,
+                    remastered_asset_header,
+                    encryption_key,
+                    data_offset,
+                    stored_hash,
                 )
 
-    def __get_asset_data(self, header, encryption_key):
-        data_length = (
-            header.compressedLength
-            if header.compressedLength >= 0
-            else header.decompressedLength
+            record["remastered"][remastered_asset_header.name] = self.__get_file_record(
+                remastered_path, content_hash
+            )
+            position = data_offset + self.package.get_data_length(
+                remastered_asset_header
+            )
+
+        stored_hash.update(
+            self.package.view[position : entry.offset + entry.dataLength]
         )
+        record["storedSha1"] = stored_hash.hexdigest()
 
-        packet_data = self.package.read(data_length)
+        return record
 
-        if header.compressedLength > -2:
-            for i in range(0, min(len(packet_data), 0x100), 0x10):
-                packet_data = EGSEncryption.decrypt_chunk(
-                    encryption_key, packet_data, i
-                )
+    def __write_asset_data(
+        self, writer, header, encryption_key, offset, stored_hash=None
+    ):
+        content_hash = hashlib.sha1() if self.hash_content else None
 
-        if header.compressedLength > -1:
-            return self.__decompress_asset_data(packet_data, header.decompressedLength)
-        else:
-            return packet_data
+        for chunk in self.__get_asset_data(header, encryption_key, offset, stored_hash):
+            writer.write(chunk)
+
+            if content_hash is not None:
+                content_hash.update(chunk)
 
-    def __decompress_asset_data(self, data, expected_length):
-        decompressed_data = zlib.decompress(data)
+        return content_hash.hexdigest() if content_hash is not None else None
 
-        if len(decompressed_data) != expected_length:
+    @staticmethod
+    def __get_file_record(path, content_hash):
+        stat = os.stat(path)
+        record = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+        if content_hash is not None:
+            record["sha1"] = content_hash
+
+        return record
+
+    def __get_asset_data(self, header, encryption_key, offset, stored_hash=None):
+        """Yield the asset contents chunk by chunk.
+
+        Uncompressed data comes straight from the package mapping, compressed
+        data is inflated at most ``buffer_size`` bytes at a time.
+        """
+        decompressed_length = 0
+
+        for chunk in self.package.iter_data(
+            encryption_key, header, offset, self.buffer_size, stored_hash
+        ):
+            decompressed_length += len(chunk)
+            yield chunk
+
+        if (
+            header.compressedLength > -1
+            and decompressed_length != header.decompressedLength
+        ):
             logger.warning(
                 "Decompressed data length does not match, something is wrong with the archive... (expected: %d, got: %d)"
-                % (expected_length, len(decompressed_data))
+                % (header.decompressedLength, decompressed_length)
             )
-
-        return decompressed_data
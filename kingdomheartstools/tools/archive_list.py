@@ -0,0 +1,152 @@
+import json
+import logging
+import struct
+from pathlib import Path
+
+from kingdomheartstools.helpers.FileMap import FileMap
+from kingdomheartstools.helpers.HeaderTable import HeaderTable
+from kingdomheartstools.helpers.PackageReader import PackageReader
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveList:
+    """Describe the contents of an archive without extracting it.
+
+    Only the .hed and the asset headers (plus remastered entry tables) are
+    read, so the package is touched one page per asset at most.
+    """
+
+    def __init__(self, input_path):
+        self.header = HeaderTable.read(Path(input_path).with_suffix(".hed"))
+        self.package = PackageReader(Path(input_path).with_suffix(".pkg"))
+        self.file_map = FileMap()
+
+    def list(self):
+        entries = []
+
+        for position in range(len(self.header)):
+            entry = self.header[position]
+
+            info = {
+                "name": self.file_map.get(entry.md5, f"{entry.md5}.raw"),
+                "md5": entry.md5,
+                "offset": entry.offset,
+                "dataLength": entry.dataLength,
+                "actualLength": entry.actualLength,
+            }
+
+            try:
+                _, blocks = self.package.read_asset(entry.offset)
+            except struct.error:
+                logger.error(f"Asset header of {info['name']} is out of bounds")
+                info["error"] = "Asset header out of bounds"
+                entries.append(info)
+                continue
+            except (UnicodeDecodeError, ValueError, OverflowError) as e:
+                # Corrupt remastered names or creation dates
+                logger.error(f"Asset header of {info['name']} is unreadable: {e}")
+                info["error"] = f"Unreadable asset header: {e}"
+                entries.append(info)
+                continue
+
+            asset_header, _ = blocks[0]
+
+            info.update(self.__describe(asset_header))
+            info["timestamp"] = asset_header.creationDate.isoformat()
+            info["remastered"] = [
+                {"name": remastered_asset_header.name}
+                | self.__describe(remastered_asset_header)
+                for remastered_asset_header, _ in blocks[1:]
+            ]
+
+            entries.append(info)
+
+        return entries
+
+    def stat(self):
+        entries = self.list()
+
+        summary = {
+            "entries": len(entries),
+            "remasteredAssets": 0,
+            "packageSize": len(self.package),
+            "storedSize": 0,
+            "decompressedSize": 0,
+            "compressed": 0,
+            "encrypted": 0,
+            "stored": 0,
+            "errors": 0,
+        }
+
+        for entry in entries:
+            summary["storedSize"] += entry["dataLength"]
+
+            if "error" in entry:
+                summary["errors"] += 1
+                continue
+
+            summary["remasteredAssets"] += len(entry["remastered"])
+
+            for asset in [entry] + entry["remastered"]:
+                summary["decompressedSize"] += asset["decompressedLength"]
+
+                if asset["compressed"]:
+                    summary["compressed"] += 1
+                elif asset["encrypted"]:
+                    summary["encrypted"] += 1
+                else:
+                    summary["stored"] += 1
+
+        return summary
+
+    def to_json(self):
+        return json.dumps(self.list(), indent=4)
+
+    def to_table(self):
+        lines = [
+            f"{'Offset':>12} {'Stored':>10} {'Size':>10} {'Mode':<10} {'Timestamp':<19} Name"
+        ]
+
+        for entry in self.list():
+            if "error" in entry:
+                lines.append(
+                    f"{entry['offset']:>12} {entry['dataLength']:>10} {'':>10} "
+                    f"{'error':<10} {'':<19} {entry['name']}"
+                )
+                continue
+
+            lines.append(
+                f"{entry['offset']:>12} {entry['dataLength']:>10} "
+                f"{entry['decompressedLength']:>10} {self.__get_mode(entry):<10} "
+                f"{entry['timestamp'][:19]:<19} {entry['name']}"
+            )
+
+            for remastered in entry["remastered"]:
+                lines.append(
+                    f"{'':>12} {remastered['storedLength']:>10} "
+                    f"{remastered['decompressedLength']:>10} "
+                    f"{self.__get_mode(remastered):<10} {'':<19}   "
+                    f"remastered_{Path(entry['name']).name}/{remastered['name']}"
+                )
+
+        return "\n".join(lines)
+
+    @staticmethod
+    def __describe(header):
+        return {
+            "decompressedLength": header.decompressedLength,
+            "compressedLength": header.compressedLength,
+            "storedLength": PackageReader.get_data_length(header),
+            "encrypted": header.compressedLength > -2,
+            "compressed": header.compressedLength > -1,
+        }
+
+    @staticmethod
+    def __get_mode(asset):
+        if asset["compressed"]:
+            return "zlib+egs"
+        elif asset["encrypted"]:
+            return "egs"
+
+        return "stored"
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+from kingdomheartstools.helpers.AssetEncoder import AssetEncoder
+from kingdomheartstools.helpers.HeaderTable import HeaderTable
+from kingdomheartstools.helpers.PackageReader import PackageReader
+from kingdomheartstools.tools.archive_extract import ArchiveExtract
+
+logger = logging.getLogger(__name__)
+
+
+class ArchivePatch:
+    """Append modified assets to an existing archive in place.
+
+    New asset records are appended to the end of the .pkg and only the
+    matching 0x20-byte .hed entries are rewritten, so the old records are
+    left behind as dead space (see ``ArchiveCompact``). Modifications are
+    detected against the manifest.json written by ``ArchiveExtract``.
+
+    Re-encoding an asset that has remastered assets would lose them (their
+    table cannot be rebuilt yet), so such entries are refused unless
+    ``drop_remastered`` is set.
+    """
+
+    def __init__(self, input_path, archive_path):
+        self.input_path = input_path
+
+        with open(f"{self.input_path}/file_list.json", "r") as f:
+            self.__file_list = json.load(f)
+
+        self.__manifest = ArchiveExtract.read_manifest(self.input_path)
+
+        self.header_path = Path(archive_path).with_suffix(".hed")
+        self.package_path = Path(archive_path).with_suffix(".pkg")
+
+        self.encoder = AssetEncoder(input_path, manifest=self.__manifest)
+
+    def patch(self, drop_remastered=False):
+        header = HeaderTable.read(self.header_path)
+        package = PackageReader(self.package_path)
+
+        modified = []
+        with_remastered = []
+
+        for filename, md5 in self.__file_list.items():
+            position = header.find(md5)
+
+            # file_list.json lists the whole archive, entries that were not
+            # extracted are left as they are
+            if (
+                position is not None
+                and filename not in self.__manifest
+                and not (Path(self.input_path) / filename).exists()
+            ):
+                continue
+
+            if position is not None and self.encoder.is_unchanged(
+                filename, self.__manifest.get(filename), package, header[position]
+            ):
+                continue
+
+            modified.append((filename, md5, position))
+
+            if (
+                position is not None
+                and len(package.read_asset(header[position].offset)[1]) > 1
+            ):
+                with_remastered.append(filename)
+
+        package.close()
+
+        if with_remastered and not drop_remastered:
+            raise Exception(
+                "Patching would drop the remastered assets of "
+                f"{', '.join(with_remastered)}, pass --drop-remastered to "
+                "patch them anyway"
+            )
+
+        if not modified:
+            logger.info("Nothing to patch")
+            return
+
+        with open(self.header_path, "r+b") as header_file, open(
+            self.package_path, "r+b"
+        ) as package_file:
+            package_file.seek(0, os.SEEK_END)
+
+            # Keep appended records aligned like the rest of the package
+            if package_file.tell() % 0x10 != 0:
+                package_file.write(b"\x00" * (0x10 - package_file.tell() % 0x10))
+
+            for filename, md5, position in modified:
+                logger.info(f"Patching {filename}...")
+
+                if filename in with_remastered:
+                    logger.warning(f"Dropping the remastered assets of {filename}")
+
+                offset = package_file.tell()
+                asset_header, data_size = self.encoder.encode_to(filename, package_file)
+                asset_size = data_size + len(asset_header)
+
+                if position is None:
+                    header_file.seek(0, os.SEEK_END)
+                else:
+                    header_file.seek(position * HeaderTable.entry_size)
+
+                header_file.write(bytes.fromhex(md5))
+                header_file.write(int.to_bytes(offset, 8, "little"))
+                header_file.write(int.to_bytes(asset_size, 4, "little"))
+                header_file.write(int.to_bytes(data_size, 4, "little"))
+
+                package_file.seek(offset)
+                stored_hash = hashlib.sha1(package_file.read(asset_size)).hexdigest()
+                package_file.seek(0, os.SEEK_END)
+
+                self.__update_record(
+                    filename, md5, offset, asset_header, asset_size, stored_hash
+                )
+
+        self.__write_manifest()
+
+        logger.info(f"Patched {len(modified)} assets")
+
+    def __update_record(
+        self, filename, md5, offset, asset_header, asset_size, stored_hash
+    ):
+        """Point the manifest at the new record so it is not patched again."""
+        stat = os.stat(Path(self.input_path) / filename)
+        compressed_length = int.from_bytes(asset_header[0x8:0xC], "little", signed=True)
+
+        record = self.__manifest.get(filename, {})
+        record.pop("removed", None)
+
+        record.update(
+            {
+                "md5": md5,
+                "offset": offset,
+                "dataLength": asset_size,
+                "actualLength": asset_size - len(asset_header),
+                "timestamp": int.from_bytes(asset_header[0xC:0x10], "little"),
+                "encrypt": compressed_length > -2,
+                "compress": compressed_length > -1,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "storedSha1": stored_hash,
+                "remastered": {},
+            }
+        )
+
+        self.__manifest[filename] = record
+
+    def __write_manifest(self):
+        with open(
+            Path(self.input_path) / ArchiveExtract.manifest_name, "w", encoding="utf-8"
+        ) as f:
+            json.dump(
+                {
+                    "version": ArchiveExtract.manifest_version,
+                    "entries": self.__manifest,
+                },
+                f,
+            )
@@ -1,15 +1,35 @@
+import hashlib
 import json
 import logging
-import struct
-import zlib
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
 
-import filedate
+from kingdomheartstools.common.HeaderEntry import HeaderEntry
+from kingdomheartstools.helpers.AssetEncoder import AssetEncoder
+from kingdomheartstools.helpers.HeaderTable import HeaderTable
+from kingdomheartstools.helpers.PackageReader import PackageReader
+from kingdomheartstools.tools.archive_extract import ArchiveExtract
 
 logger = logging.getLogger(__name__)
 
 
 class ArchiveRepack:
-    def __init__(self, input_path, output_path):
+    # Records encoded ahead by parallel workers stay in memory up to this
+    # size and are spooled to a temporary file past it
+    spool_size = 0x1000000
+
+    # Files per extension (and bytes per file) compressed by estimate()
+    estimate_samples = 16
+    estimate_sample_size = 0x100000
+
+    def __init__(
+        self, input_path, output_path, base_path=None, policy=None, dedup=False
+    ):
         self.__file_list = []
 
         self.input_path = input_path
@@ -17,68 +37,316 @@ class ArchiveRepack:
 
         self.__read_file_list()
 
-        self.header = open(f"{self.output_path}.hed", "wb")
-        self.package = open(f"{self.output_path}.pkg", "wb")
+        # Folders extracted without sidecars keep the flags in the manifest
+        self.__manifest = ArchiveExtract.read_manifest(self.input_path)
+        self.encoder = AssetEncoder(input_path, policy=policy, manifest=self.__manifest)
+
+        # With a base archive, assets that were not modified since extraction
+        # are copied from it verbatim instead of being re-encoded
+        self.base_header = None
+
+        if base_path is not None:
+            self.base_header = HeaderTable.read(Path(base_path).with_suffix(".hed"))
+            self.base_package = PackageReader(Path(base_path).with_suffix(".pkg"))
+
+        # With dedup, records identical to one already written are dropped
+        # again and their .hed entry points at the earlier copy. Records are
+        # grouped by size, so only same-sized ones are ever read back and
+        # hashed.
+        self.dedup = dedup
+        self.__records = {}
+        self.__saved = {}
 
     def __read_file_list(self):
         with open(f"{self.input_path}/file_list.json", "r") as f:
             self.__file_list = json.load(f)
 
-    def repack(self):
+    def repack(self, jobs=1):
+        self.__check_extracted()
+
+        self.header = open(f"{self.output_path}.hed", "wb")
+        self.package = open(f"{self.output_path}.pkg", "w+b")
+
+        if jobs > 1:
+            # zlib releases the GIL, so a thread pool is enough to compress
+            # on every core. Only a bounded window of encoded assets is kept
+            # in flight, and they are written strictly in file_list.json order.
+            with ThreadPoolExecutor(
+                max_workers=jobs, thread_name_prefix="repack"
+            ) as executor:
+                pending = deque()
+
+                for filename, md5 in self.__file_list.items():
+                    pending.append(
+                        executor.submit(self.__prepare_asset, filename, md5, True)
+                    )
+
+                    if len(pending) >= jobs * 2:
+                        self.__write_asset(*pending.popleft().result())
+
+                while pending:
+                    self.__write_asset(*pending.popleft().result())
+        else:
+            for filename, md5 in self.__file_list.items():
+                self.__write_asset(*self.__prepare_asset(filename, md5))
+
+        self.header.close()
+        self.package.close()
+
+        if self.dedup:
+            self.__report_saved()
+
+    def estimate(self, jobs=1):
+        """Predict the output sizes and repack time without writing anything.
+
+        Assets copied from the base archive keep their stored size. For the
+        rest, up to ``estimate_samples`` files per extension are compressed
+        (``estimate_sample_size`` bytes each) with the configured policy to
+        measure the ratio and throughput of that extension.
+        """
+        self.__check_extracted()
+
+        groups = {}
+        result = {
+            "assets": len(self.__file_list),
+            "headerSize": len(self.__file_list) * HeaderTable.entry_size,
+            "packageSize": 0,
+            "copied": 0,
+            "compressed": 0,
+            "stored": 0,
+            "jobs": jobs,
+            "estimatedSeconds": 0.0,
+            "extensions": {},
+        }
+
         for filename, md5 in self.__file_list.items():
-            logger.info(f"Packing {filename}...")
+            if self.base_header is not None:
+                base_entry = self.__get_unchanged_base_entry(filename, md5)
 
-            header_length = 0x10
+                if base_entry is not None:
+                    result["copied"] += 1
+                    result["packageSize"] += base_entry.dataLength
+                    continue
 
-            self.header.write(bytes.fromhex(md5))
-            filepath = f"{self.input_path}/{filename}"
-            with open(f"{filepath}.json", "r") as f:
-                file_config = json.load(f)
+            path = Path(self.input_path) / filename
+            size = os.path.getsize(path)
+            file_config = self.encoder.get_file_config(filename)
 
-            with open(filepath, "rb") as f:
-                file_data, decompressed_length = self.__pad_data(f.read())
+            if file_config["compress"] and (
+                not file_config["encrypt"] or self.encoder.policy.should_compress(path)
+            ):
+                groups.setdefault(path.suffix or "(none)", []).append((path, size))
+            else:
+                result["stored"] += 1
+                result["packageSize"] += self.__get_record_size(size)
 
-                file_dates = filedate.File(filepath).get()
-                creation_time = file_dates.get("created")
+        compress_seconds = 0.0
+        # Even an empty file is stored as a complete zlib stream
+        empty_size = len(self.encoder.policy.compress(b""))
 
-            if not file_config["encrypt"]:
-                compressed_length = -2
-            elif not file_config["compress"]:
-                compressed_length = -1
+        for extension, files in sorted(groups.items()):
+            ratio, throughput = self.__sample_compression(files)
+            size = sum(file_size for _, file_size in files)
+            estimated_size = 0
 
-            if file_config["compress"]:
-                file_data, compressed_length = self.__pad_data(zlib.compress(file_data))
+            for _, file_size in files:
+                estimated_size += self.__get_record_size(
+                    max(int(file_size * ratio), empty_size)
+                )
 
-            if file_config["encrypt"]:
-                logger.warning("Encrypted assets are not supported yet, skipping...")
-                return
+            result["compressed"] += len(files)
+            result["packageSize"] += estimated_size
+            result["extensions"][extension] = {
+                "assets": len(files),
+                "size": size,
+                "ratio": round(ratio, 4),
+                "estimatedSize": estimated_size,
+            }
 
-            offset = self.package.tell()
+            compress_seconds += size / throughput if throughput else 0.0
 
-            data_size = len(file_data)
-            asset_size = data_size + header_length
+        # Compression is the bottleneck and spreads over the worker threads
+        result["estimatedSeconds"] = round(
+            compress_seconds / max(1, min(jobs, os.cpu_count() or 1)), 2
+        )
 
-            self.header.write(int.to_bytes(offset, 8, "little"))
-            self.header.write(int.to_bytes(asset_size, 4, "little"))
-            self.header.write(int.to_bytes(data_size, 4, "little"))
+        return result
+
+    def __check_extracted(self):
+        """Fail before writing anything if an entry cannot be repacked.
+
+        file_list.json lists the whole archive, also after a filtered
+        extraction. Entries that were not extracted can only be copied from
+        the base archive.
+        """
+        missing = [
+            filename
+            for filename, md5 in self.__file_list.items()
+            if not (Path(self.input_path) / filename).exists()
+            and (
+                self.base_header is None
+                or self.base_header.find(md5) is None
+                or filename in self.__manifest
+            )
+        ]
 
-            self.package.write(int.to_bytes(decompressed_length, 4, "little"))
-            self.package.write(int.to_bytes(0, 4, "little"))
-            self.package.write(
-                int.to_bytes(compressed_length, 4, "little", signed=True)
+        if missing:
+            raise Exception(
+                f"{len(missing)} entries are missing from {self.input_path} "
+                f"({', '.join(missing[:10])}{', ...' if len(missing) > 10 else ''}), "
+                "repack with --base set to the original archive to copy the "
+                "entries that were not extracted"
             )
 
-            timestamp = int(creation_time.timestamp())
+    @staticmethod
+    def __get_record_size(data_size):
+        """Size of a record without remastered assets, padded like encode_to."""
+        return 0x10 + data_size + len(AssetEncoder.get_padding(data_size))
+
+    def __sample_compression(self, files):
+        """Return the compression ratio and throughput (bytes/s) of files."""
+        step = max(1, len(files) // self.estimate_samples)
+        sampled = 0
+        compressed = 0
+        elapsed = 0.0
+
+        for path, _ in files[::step][: self.estimate_samples]:
+            with open(path, "rb") as f:
+                data = f.read(self.estimate_sample_size)
+
+            start = time.perf_counter()
+            compressed += len(self.encoder.policy.compress(data))
+            elapsed += time.perf_counter() - start
+            sampled += len(data)
+
+        if sampled == 0:
+            return 1.0, 0.0
+
+        return compressed / sampled, sampled / elapsed if elapsed else 0.0
+
+    def __prepare_asset(self, filename, md5, spool=False):
+        """Return the md5, filename and source of a record for __write_asset.
+
+        The source is a base .hed entry to copy verbatim, a spooled record
+        already encoded by a parallel worker, or None to encode the file
+        straight into the package.
+        """
+        if self.base_header is not None:
+            base_entry = self.__get_unchanged_base_entry(filename, md5)
+
+            if base_entry is not None:
+                logger.info(f"Copying {filename}...")
+                return md5, filename, base_entry
+
+        logger.info(f"Packing {filename}...")
+
+        if not spool:
+            return md5, filename, None
+
+        record = SpooledTemporaryFile(max_size=self.spool_size)
+        self.encoder.encode_to(filename, record)
+
+        return md5, filename, record
+
+    def __get_unchanged_base_entry(self, filename, md5):
+        """Return the base .hed entry of a file if it is safe to copy verbatim."""
+        position = self.base_header.find(md5)
+
+        if position is None:
+            return None
+
+        base_entry = self.base_header[position]
+
+        # Entries left out of a filtered extraction are kept as they are
+        if (
+            filename not in self.__manifest
+            and not (Path(self.input_path) / filename).exists()
+        ):
+            return base_entry
+
+        if not self.encoder.is_unchanged(
+            filename, self.__manifest.get(filename), self.base_package, base_entry
+        ):
+            return None
+
+        return base_entry
+
+    def __write_asset(self, md5, filename, source):
+        offset = self.package.tell()
+
+        if isinstance(source, HeaderEntry):
+            self.base_package.copy_to(self.package, source.offset, source.dataLength)
+            asset_size, data_size = source.dataLength, source.actualLength
+        else:
+            if source is None:
+                self.encoder.encode_to(filename, self.package)
+            else:
+                source.seek(0)
+                shutil.copyfileobj(source, self.package)
+                source.close()
+
+            asset_size = self.package.tell() - offset
+            data_size = asset_size - 0x10
+
+        if self.dedup:
+            offset = self.__deduplicate(filename, offset, asset_size)
+
+        self.header.write(bytes.fromhex(md5))
+        self.header.write(int.to_bytes(offset, 8, "little"))
+        self.header.write(int.to_bytes(asset_size, 4, "little"))
+        self.header.write(int.to_bytes(data_size, 4, "little"))
+
+    def __deduplicate(self, filename, offset, asset_size):
+        """Return the offset of an identical earlier record, or ``offset``."""
+        records = self.__records.setdefault(asset_size, [])
+
+        if records:
+            digest = self.__hash_record(offset, asset_size)
+
+            for i, (record_offset, record_digest) in enumerate(records):
+                if record_digest is None:
+                    record_digest = self.__hash_record(record_offset, asset_size)
+                    records[i] = (record_offset, record_digest)
+
+                if record_digest == digest:
+                    self.package.seek(offset)
+                    self.package.truncate()
+
+                    saved = self.__saved.setdefault(
+                        Path(filename).suffix or "(none)", [0, 0]
+                    )
+                    saved[0] += 1
+                    saved[1] += asset_size
+
+                    return record_offset
+
+            records.append((offset, digest))
+        else:
+            records.append((offset, None))
+
+        return offset
+
+    def __hash_record(self, offset, asset_size):
+        digest = hashlib.sha1()
+
+        self.package.seek(offset)
+
+        while asset_size > 0:
+            chunk = self.package.read(min(asset_size, 0x100000))
+            digest.update(chunk)
+            asset_size -= len(chunk)
 
-            self.package.write(int.to_bytes(timestamp, 4, "little"))
-            self.package.write(file_data)
+        self.package.seek(0, os.SEEK_END)
 
-    def __pad_data(self, data):
-        """Pad data to 16 bytes. (If not already)"""
-        orig_length = len(data)
-        length = orig_length
+        return digest.digest()
 
-        if length % 16 != 0:
-            length += 16 - (length % 16)
+    def __report_saved(self):
+        for extension, (count, saved) in sorted(
+            self.__saved.items(), key=lambda item: item[1][1], reverse=True
+        ):
+            logger.info(f"{extension}: {count} duplicate assets, {saved} bytes saved")
 
-        return data + b"\xCD" * (length - orig_length), orig_length
+        logger.info(
+            f"Deduplication saved {sum(saved for _, saved in self.__saved.values())} "
+            "bytes in total"
+        )
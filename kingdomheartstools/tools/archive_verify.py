@@ -0,0 +1,152 @@
+import logging
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from kingdomheartstools.helpers.FileMap import FileMap
+from kingdomheartstools.helpers.HeaderTable import HeaderTable
+from kingdomheartstools.helpers.PackageReader import PackageReader
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveVerify:
+    """Check every entry of an archive without writing anything to disk.
+
+    Records must stay within the package, asset headers and remastered entry
+    tables must be consistent with the record, and compressed blocks must
+    inflate to exactly their decompressedLength. Blocks are decoded in
+    ``buffer_size`` chunks that are discarded right away.
+    """
+
+    def __init__(self, input_path, buffer_size=0x100000):
+        self.input_path = input_path
+        self.buffer_size = buffer_size
+
+        self.header = HeaderTable.read(Path(input_path).with_suffix(".hed"))
+        self.package = PackageReader(Path(input_path).with_suffix(".pkg"))
+        self.file_map = FileMap()
+
+    def verify(self, jobs=1):
+        positions = range(len(self.header))
+
+        if jobs > 1:
+            # Inflating releases the GIL, so threads sharing the mapping scale
+            with ThreadPoolExecutor(
+                max_workers=jobs, thread_name_prefix="verify"
+            ) as executor:
+                results = list(executor.map(self.__verify_entry, positions))
+        else:
+            results = [self.__verify_entry(position) for position in positions]
+
+        problems = [
+            problem for entry_problems, _ in results for problem in entry_problems
+        ]
+
+        report = {
+            "archive": str(self.input_path),
+            "entries": len(self.header),
+            "remasteredAssets": sum(remastered for _, remastered in results),
+            "packageSize": len(self.package),
+            "errors": len(problems),
+            "problems": problems,
+        }
+
+        if problems:
+            logger.error(f"Found {len(problems)} problems in {self.input_path}")
+        else:
+            logger.info(f"{len(self.header)} entries verified, no problems found")
+
+        return report
+
+    def __verify_entry(self, position):
+        """Return the problems found in an entry and its remastered count."""
+        entry = self.header[position]
+        name = self.file_map.get(entry.md5, f"{entry.md5}.raw")
+        problems = []
+
+        def problem(message, asset=None):
+            problems.append(
+                {
+                    "name": name,
+                    "md5": entry.md5,
+                    "offset": entry.offset,
+                    "asset": asset,
+                    "error": message,
+                }
+            )
+
+        record_end = entry.offset + entry.dataLength
+
+        if entry.dataLength < 0x10:
+            problem(f"Record is shorter than an asset header ({entry.dataLength})")
+            return problems, 0
+
+        if record_end > len(self.package):
+            problem(
+                f"Record ends at {record_end}, "
+                f"past the end of the package ({len(self.package)})"
+            )
+            return problems, 0
+
+        (remastered_asset_count,) = struct.unpack_from(
+            "<I", self.package.view, entry.offset + 0x4
+        )
+
+        table_end = entry.offset + 0x10 + remastered_asset_count * 0x30
+
+        if table_end > record_end:
+            problem(
+                f"Remastered entry table ({remastered_asset_count} entries) "
+                "does not fit in the record"
+            )
+            return problems, 0
+
+        try:
+            seed, blocks = self.package.read_asset(entry.offset)
+        except (UnicodeDecodeError, ValueError, OverflowError) as e:
+            # Corrupt remastered names or creation dates
+            problem(f"Unreadable asset header: {e}")
+            return problems, 0
+
+        for header, data_offset in blocks:
+            asset = getattr(header, "name", None)
+
+            if header.compressedLength < -2:
+                problem(f"Invalid compressedLength {header.compressedLength}", asset)
+                continue
+
+            data_end = data_offset + PackageReader.get_data_length(header)
+
+            if data_end > record_end:
+                problem(
+                    f"Data ends at {data_end}, past the end of the record "
+                    f"({record_end})",
+                    asset,
+                )
+                continue
+
+            if header.compressedLength < 0:
+                continue
+
+            # Only compressed blocks carry a length that can be checked
+            decompressed_length = 0
+
+            try:
+                for chunk in self.package.iter_data(
+                    seed, header, data_offset, self.buffer_size
+                ):
+                    decompressed_length += len(chunk)
+            except zlib.error as e:
+                problem(str(e), asset)
+                continue
+
+            if decompressed_length != header.decompressedLength:
+                problem(
+                    f"Decompressed to {decompressed_length} bytes, "
+                    f"expected {header.decompressedLength}",
+                    asset,
+                )
+
+        return problems, len(blocks) - 1
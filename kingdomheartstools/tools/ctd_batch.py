@@ -0,0 +1,108 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from kingdomheartstools.helpers.BuildCache import BuildCache
+from kingdomheartstools.helpers.Catalog import Catalog
+from kingdomheartstools.tools.ctd_compile import CTDCompile
+from kingdomheartstools.tools.ctd_decompile import CTDDecompile
+
+logger = logging.getLogger(__name__)
+
+
+class CTDBatch:
+    """Compile or decompile every CTD in a folder tree with a process pool.
+
+    A failing file is logged and counted, the rest of the tree is still
+    processed. With a ``BuildCache``, CTDs whose catalog and .meta did not
+    change since they were last compiled are skipped (unless ``force`` is set).
+    """
+
+    def __init__(
+        self, input_folder, jobs=None, cache=None, force=False, catalog_format="po"
+    ):
+        self.input_folder = Path(input_folder)
+        self.jobs = jobs
+        self.cache = cache
+        self.force = force
+        self.catalog_format = catalog_format
+
+    def compile_all(self):
+        ctds = [
+            CTDCompile(path)
+            for path in sorted(self.input_folder.rglob("*.meta"))
+            if Catalog.find(path).exists()
+        ]
+        skipped = 0
+
+        if self.cache is not None and not self.force:
+            stale = [ctd for ctd in ctds if not self.__is_fresh(ctd)]
+            skipped = len(ctds) - len(stale)
+            ctds = stale
+
+        result = self.__run(self.compile_file, [ctd.output_path for ctd in ctds])
+        result["skipped"] = skipped
+
+        if self.cache is not None:
+            for ctd in ctds:
+                if str(ctd.output_path) not in result["errors"]:
+                    self.cache.update(self.__get_key(ctd), ctd.inputs, ctd.outputs)
+
+        return result
+
+    def decompile_all(self):
+        result = self.__run(
+            partial(self.decompile_file, catalog_format=self.catalog_format),
+            sorted(self.input_folder.rglob("*.ctd")),
+        )
+        result["skipped"] = 0
+
+        return result
+
+    def __is_fresh(self, ctd):
+        return self.cache.is_fresh(self.__get_key(ctd), ctd.inputs)
+
+    @staticmethod
+    def __get_key(ctd):
+        return BuildCache.get_key("ctd-compile", ctd.output_path)
+
+    @staticmethod
+    def compile_file(path):
+        ctd = CTDCompile(path)
+        ctd.compile()
+        return len(ctd.metadata["messages"])
+
+    @staticmethod
+    def decompile_file(path, catalog_format="po"):
+        ctd = CTDDecompile(path, catalog_format)
+        ctd.decompile()
+        return len(ctd.message_entries)
+
+    def __run(self, function, paths):
+        start_time = time.perf_counter()
+        messages = 0
+        errors = {}
+
+        with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+            futures = {path: executor.submit(function, path) for path in paths}
+
+            for path, future in futures.items():
+                try:
+                    messages += future.result()
+                except Exception as e:
+                    logger.error(f"{path}: {e}")
+                    errors[str(path)] = str(e)
+
+        elapsed = time.perf_counter() - start_time
+
+        return {
+            "files": len(paths),
+            "failed": len(errors),
+            "messages": messages,
+            "seconds": round(elapsed, 3),
+            "filesPerSecond": round(len(paths) / elapsed, 2) if elapsed else 0,
+            "messagesPerSecond": round(messages / elapsed, 2) if elapsed else 0,
+            "errors": errors,
+        }
@@ -1,113 +1,117 @@
 import json
 import re
+from dataclasses import fields
 from pathlib import Path
 
-from polib import pofile
+from ..common.ctd.Header import Header
+from ..common.ctd.LayoutBBS import LayoutBBS
+from ..common.ctd.LayoutReMIX import LayoutReMIX
+from ..common.ctd.MessageHeader import MessageHeader
+from ..helpers.Catalog import Catalog
 
 
 class CTDCompile:
+    __special_chars = re.compile(r"{(\d+)}")
+
     def __init__(self, input_path):
-        metadata_path = Path(input_path).with_suffix(".meta")
+        self.metadata_path = Path(input_path).with_suffix(".meta")
+        self.catalog_path = Catalog.find(input_path)
+        self.output_path = Path(input_path).with_suffix(".ctd")
 
-        with open(metadata_path, "r") as f:
-            self.metadata = json.load(f)
+        self.metadata = None
+        self.entries = None
 
-        po_path = Path(input_path).with_suffix(".po")
-        self.po = pofile(pofile=po_path)
+        # What BuildCache checks to skip an unchanged CTD
+        self.inputs = [self.metadata_path, self.catalog_path]
+        self.outputs = [self.output_path]
 
-        self.output_path = Path(input_path).with_suffix(".ctd")
+    def __load(self):
+        with open(self.metadata_path, "r") as f:
+            self.metadata = json.load(f)
+
+        self.entries = Catalog.read(self.catalog_path)
 
     def compile(self):
-        with open(self.output_path, "wb") as f:
-            message_block_offset = 0x20
-            layout_block_offset = message_block_offset + (
-                len(self.metadata["messages"]) * 8
+        """Assemble the whole CTD in one buffer and write it at once.
+
+        Version 503 (ReMIX) uses 8-byte message headers with 16-bit text
+        offsets (wrapping past 0xFFFF, see ``CTDDecompile``) and UTF-16 text,
+        version 1 (BBS) uses 12-byte message headers with 32-bit offsets,
+        ``LayoutBBS`` layouts and cp932 text.
+        """
+        self.__load()
+
+        version = self.metadata["general"]["version"]
+        messages = self.metadata["messages"]
+        layouts = self.metadata["layouts"]
+
+        # Same formats CTDDecompile reads for each version
+        message_header = MessageHeader.get_struct(version)
+        layout_class = LayoutBBS if version == 1 else LayoutReMIX
+        layout = layout_class.struct
+        encoding = "utf-16-le" if version == 503 else "cp932"
+        offset_mask = 0xFFFF if version == 503 else 0xFFFFFFFF
+
+        message_block_offset = Header.struct.size
+        layout_block_offset = message_block_offset + len(messages) * message_header.size
+        layout_block_offset += -layout_block_offset % 0x10
+        text_block_offset = layout_block_offset + len(layouts) * layout.size
+
+        texts = [
+            self.__reformat_string(
+                entry.msgstr if entry.msgstr != "" else entry.msgid
+            ).encode(encoding)
+            for entry in self.entries
+        ]
+
+        length = text_block_offset + sum(len(text) for text in texts)
+        data = bytearray(length + (-length % 0x10))
+
+        Header.struct.pack_into(
+            data,
+            0,
+            b"@CTD",
+            version,
+            self.metadata["general"]["unknown_1"],
+            self.metadata["general"]["unknown_2"],
+            len(layouts),
+            len(messages),
+            message_block_offset,
+            layout_block_offset,
+            text_block_offset,
+            self.metadata["general"]["unknown_3"],
+        )
+
+        layout_fields = [field.name for field in fields(layout_class)]
+
+        for i, entry in enumerate(layouts):
+            layout.pack_into(
+                data,
+                layout_block_offset + i * layout.size,
+                *[entry[name] for name in layout_fields],
             )
 
-            layout_block_offset += (
-                0
-                if layout_block_offset % 0x10 == 0
-                else 0x10 - (layout_block_offset % 0x10)
-            )
+        text_offset = text_block_offset
 
-            text_block_offset = layout_block_offset + (
-                len(self.metadata["layouts"]) * 20
-            )
+        for i, text in enumerate(texts):
+            message = messages[i]
 
-            f.write(b"@CTD")
-            f.write(int.to_bytes(self.metadata["general"]["version"], 4, "little"))
-            f.write(int.to_bytes(self.metadata["general"]["unknown_1"], 2, "little"))
-            f.write(int.to_bytes(self.metadata["general"]["unknown_2"], 2, "little"))
-            f.write(int.to_bytes(len(self.metadata["layouts"]), 2, "little"))
-            f.write(int.to_bytes(len(self.metadata["messages"]), 2, "little"))
-            # Message block offset
-            f.write(int.to_bytes(message_block_offset, 4, "little"))
-            # Layout block offset
-            f.write(int.to_bytes(layout_block_offset, 4, "little"))
-            # Text block offset
-            f.write(
-                int.to_bytes(
-                    text_block_offset,
-                    4,
-                    "little",
-                )
-            )
-            f.write(int.to_bytes(self.metadata["general"]["unknown_3"], 4, "little"))
-
-            # Do placeholder for message block
-            message_block_length = len(self.metadata["messages"]) * 8
-            placeholder_length = (
-                message_block_length
-                if message_block_length % 0x10 == 0
-                else (message_block_length + (0x10 - (message_block_length % 0x10)))
+            message_header.pack_into(
+                data,
+                message_block_offset + i * message_header.size,
+                message["id"],
+                message["set"],
+                text_offset & offset_mask,
+                message["layoutIndex"] * 0x10,
             )
 
-            f.write(b"\x00" * placeholder_length)
+            data[text_offset : text_offset + len(text)] = text
+            text_offset += len(text)
 
-            for layout in self.metadata["layouts"]:
-                self.__write_layout(f, layout)
+        data[length:] = b"\xCD" * (len(data) - length)
 
-            for i, text in enumerate(self.po):
-                start_offset = self.__write_text(f, text)
-                end_offset = f.tell()
-
-                f.seek(0x20 + (i * 8))  # Seek to message block
-
-                message = self.metadata["messages"][i]
-
-                f.write(int.to_bytes(message["id"], 2, "little"))
-                f.write(int.to_bytes(message["set"], 2, "little"))
-                f.write(int.to_bytes(start_offset, 2, "little"))
-                f.write(int.to_bytes(message["layoutIndex"] * 0x10, 2, "little"))
-
-                f.seek(end_offset)
-
-            f.write(b"\xCD" * (0 if f.tell() % 0x10 == 0 else 0x10 - (f.tell() % 0x10)))
-
-    def __write_layout(self, writer, layout):
-        writer.write(int.to_bytes(layout["unknown_1"], 2, "little"))
-        writer.write(int.to_bytes(layout["unknown_2"], 2, "little"))
-        writer.write(int.to_bytes(layout["unknown_3"], 2, "little"))
-        writer.write(int.to_bytes(layout["unknown_4"], 2, "little"))
-        writer.write(int.to_bytes(layout["unknown_5"], 1, "little"))
-        writer.write(int.to_bytes(layout["unknown_6"], 1, "little"))
-        writer.write(int.to_bytes(layout["unknown_7"], 1, "little"))
-        writer.write(int.to_bytes(layout["unknown_8"], 1, "little"))
-        writer.write(int.to_bytes(layout["unknown_9"], 2, "little"))
-        writer.write(int.to_bytes(layout["unknown_10"], 2, "little"))
-        writer.write(int.to_bytes(layout["unknown_11"], 2, "little"))
-        writer.write(int.to_bytes(layout["unknown_12"], 2, "little"))
-
-    def __write_text(self, writer, text):
-        start_offset = writer.tell()
-        text = self.__reformat_string(text.msgstr if text.msgstr != "" else text.msgid)
-        writer.write(text.encode("utf-16-le"))
-        return start_offset
+        with open(self.output_path, "wb") as f:
+            f.write(data)
 
     def __reformat_string(self, text):
-        special_chars = re.findall(r"{(\d+)}", text)
-
-        for char in special_chars:
-            text = text.replace("{%s}" % char, chr(int(char)))
-
-        return text + "\0"
+        return self.__special_chars.sub(lambda match: chr(int(match[1])), text) + "\0"
@@ -1,20 +1,24 @@
 import json
-import sys
-import unicodedata
+import re
 from pathlib import Path
 
-from polib import POEntry, POFile
-
 from kingdomheartstools.common.ctd.LayoutBBS import LayoutBBS
 
+from ..common.CatalogEntry import CatalogEntry
 from ..common.ctd.Header import Header
 from ..common.ctd.LayoutReMIX import LayoutReMIX
 from ..common.ctd.MessageHeader import MessageHeader
 from ..common.ctd.Text import Text
+from ..helpers.Catalog import Catalog
 
 
 class CTDDecompile:
-    def __init__(self, input_path):
+    # Private use characters (Unicode category "Co") are written as {code}
+    __private_chars = re.compile(
+        "[\ue000-\uf8ff\U000f0000-\U000ffffd\U00100000-\U0010fffd]"
+    )
+
+    def __init__(self, input_path, catalog_format="po"):
         self.header = None
 
         self.message_entries = []
@@ -25,143 +29,106 @@ class CTDDecompile:
         self.offset_multiplier = 0
 
         self.input_path = input_path
-        self.ctd = open(input_path, "rb")
+        self.catalog_path = Catalog.get_path(input_path, catalog_format)
+
+        # The whole file is parsed from a single read
+        with open(input_path, "rb") as f:
+            self.data = f.read()
+
+        self.view = memoryview(self.data)
 
         self.__read_header()
 
     def __read_header(self):
-        self.header = Header(
-            signature=self.ctd.read(4).decode("utf-8"),
-            version=int.from_bytes(self.ctd.read(4), "little"),
-            unknown_1=int.from_bytes(self.ctd.read(2), "little"),
-            unknown_2=int.from_bytes(self.ctd.read(2), "little"),
-            layout_count=int.from_bytes(self.ctd.read(2), "little"),
-            message_count=int.from_bytes(self.ctd.read(2), "little"),
-            message_offset=int.from_bytes(self.ctd.read(4), "little"),
-            layout_offset=int.from_bytes(self.ctd.read(4), "little"),
-            text_offset=int.from_bytes(self.ctd.read(4), "little"),
-            unknown_3=int.from_bytes(self.ctd.read(4), "little"),
-        )
+        signature, *fields = Header.struct.unpack_from(self.view)
+
+        self.header = Header(signature.decode("utf-8"), *fields)
 
         if self.header.signature != "@CTD":
             raise Exception("Invalid signature")
 
-        if self.header.message_offset != self.ctd.tell():
+        if self.header.message_offset != Header.struct.size:
             raise Exception(
                 "Invalid message offset (Expected "
                 + str(self.header.message_offset)
                 + ", got "
-                + str(self.ctd.tell())
+                + str(Header.struct.size)
                 + ")"
             )
 
+        message_header = MessageHeader.get_struct(self.header.version)
+
         for i in range(self.header.message_count):
-            self.message_entries.append(self.__read_message_header())
+            self.message_entries.append(
+                self.__read_message_header(
+                    message_header, self.header.message_offset + i * message_header.size
+                )
+            )
 
-        self.ctd.seek(self.header.layout_offset)
+        layout_class = LayoutBBS if self.header.version == 1 else LayoutReMIX
+        layout = layout_class.struct
 
         for i in range(self.header.layout_count):
-            self.layout_entries.append(self.__read_layout())
+            self.layout_entries.append(
+                layout_class(
+                    *layout.unpack_from(
+                        self.view, self.header.layout_offset + i * layout.size
+                    )
+                )
+            )
 
-        self.ctd.seek(self.header.text_offset)
+        # Null terminated UTF-16 (version 503) or cp932 (version 1) strings
+        if self.header.version == 503:
+            terminator, encoding = b"\0\0", "utf-16"
+        else:
+            terminator, encoding = b"\0", "cp932"
 
-        for i, text in enumerate(self.message_entries):
-            self.ctd.seek(text.offset)
+        for i, message in enumerate(self.message_entries):
+            end = self.__find_terminator(message.offset, terminator)
+            text = str(self.view[message.offset : end], encoding)
 
-            # Read null terminated UTF-16 (version 503) or cp932 (version 1) string
-            text = b""
+            self.text_entries.append(Text(index=i, text=self.__format_string(text)))
 
-            while True:
-                if self.header.version == 503:
-                    char = self.ctd.read(2)
-                else:
-                    char = self.ctd.read(1)
+    def __find_terminator(self, start, terminator):
+        """Return the end of the string at ``start`` (the data end if unterminated).
 
-                if int.from_bytes(char, "little") == 0:
-                    break
+        UTF-16 terminators only count on character boundaries, so matches at
+        an odd distance from ``start`` are skipped.
+        """
+        end = self.data.find(terminator, start)
 
-                text += char
+        while end != -1 and (end - start) % len(terminator) != 0:
+            end = self.data.find(terminator, end + 1)
 
-            text = text.decode("utf-16" if self.header.version == 503 else "cp932")
-            self.text_entries.append(Text(index=i, text=self.__format_string(text)))
+        return end if end != -1 else len(self.data)
 
-    def __read_message_header(self):
-        offset_size = 2 if self.header.version == 503 else 4
+    def __read_message_header(self, message_header, position):
+        message_id, message_set, offset, layout_offset = message_header.unpack_from(
+            self.view, position
+        )
 
         message = MessageHeader(
-            id=int.from_bytes(self.ctd.read(2), "little"),
-            set=int.from_bytes(self.ctd.read(2), "little"),
-            offset=int.from_bytes(self.ctd.read(offset_size), "little"),
-            layoutIndex=int(
-                int.from_bytes(self.ctd.read(offset_size), "little") / 0x10
-            ),
+            id=message_id,
+            set=message_set,
+            offset=offset,
+            layoutIndex=int(layout_offset / 0x10),
         )
 
         if self.header.version == 503:
-            message.offset = message.offset - self.header.text_offset
-
-            real_offset = (
-                self.header.text_offset
-                + ((0xFFFF * self.offset_multiplier) + message.offset)
-                + self.offset_multiplier
-            )
+            # Only the low 16 bits of the offset are stored, the texts are in
+            # order, so an offset lower than the previous one wrapped around
+            real_offset = message.offset + 0x10000 * self.offset_multiplier
 
             if real_offset < self.last_offset:
                 self.offset_multiplier += 1
-                real_offset = self.header.text_offset + (
-                    (0xFFFF * self.offset_multiplier) + message.offset
-                )
+                real_offset += 0x10000
 
             message.offset = real_offset
             self.last_offset = real_offset
         return message
 
-    def __read_layout(self):
-        if self.header.version == 1:
-            return LayoutBBS(
-                dialogX=int.from_bytes(self.ctd.read(2), "little"),
-                dialogY=int.from_bytes(self.ctd.read(2), "little"),
-                dialogWidth=int.from_bytes(self.ctd.read(2), "little"),
-                dialogHeight=int.from_bytes(self.ctd.read(2), "little"),
-                dialogAlignment=int.from_bytes(self.ctd.read(1), "little"),
-                dialogBorders=int.from_bytes(self.ctd.read(1), "little"),
-                textAlignment=int.from_bytes(self.ctd.read(1), "little"),
-                unknown_1=int.from_bytes(self.ctd.read(1), "little"),
-                fontSize=int.from_bytes(self.ctd.read(2), "little"),
-                horizontalSpace=int.from_bytes(self.ctd.read(2), "little"),
-                verticalSpace=int.from_bytes(self.ctd.read(2), "little"),
-                textX=int.from_bytes(self.ctd.read(2), "little"),
-                textY=int.from_bytes(self.ctd.read(2), "little"),
-                dialogHook=int.from_bytes(self.ctd.read(2), "little"),
-                dialogHookX=int.from_bytes(self.ctd.read(2), "little"),
-                unknown_2=int.from_bytes(self.ctd.read(2), "little"),
-                unknown_3=int.from_bytes(self.ctd.read(2), "little"),
-                unknown_4=int.from_bytes(self.ctd.read(2), "little"),
-            )
-        else:
-            return LayoutReMIX(
-                unknown_1=int.from_bytes(self.ctd.read(2), "little"),
-                unknown_2=int.from_bytes(self.ctd.read(2), "little"),
-                unknown_3=int.from_bytes(self.ctd.read(2), "little"),
-                unknown_4=int.from_bytes(self.ctd.read(2), "little"),
-                unknown_5=int.from_bytes(self.ctd.read(1), "little"),
-                unknown_6=int.from_bytes(self.ctd.read(1), "little"),
-                unknown_7=int.from_bytes(self.ctd.read(1), "little"),
-                unknown_8=int.from_bytes(self.ctd.read(1), "little"),
-                unknown_9=int.from_bytes(self.ctd.read(2), "little"),
-                unknown_10=int.from_bytes(self.ctd.read(2), "little"),
-                unknown_11=int.from_bytes(self.ctd.read(2), "little"),
-                unknown_12=int.from_bytes(self.ctd.read(2), "little"),
-            )
-
     def __format_string(self, text):
-        priv_chars = "".join(c for c in text if unicodedata.category(c) in {"Co"})
-
-        if len(priv_chars) > 0:
-            for priv_char in priv_chars:
-                text = text.replace(priv_char, "{%s}" % ord(priv_char), 1)
-
-        return text
+        return self.__private_chars.sub(lambda match: "{%s}" % ord(match[0]), text)
 
     def decompile(self):
         meta_file = {
@@ -186,9 +153,7 @@ class CTDDecompile:
         ) as output:
             json.dump(meta_file, output)
 
-        po = POFile()
-
-        for text in self.text_entries:
-            po.append(POEntry(msgid=text.text, msgstr=""))
-
-        po.save(Path(self.input_path).with_suffix(".po"))
+        Catalog.write(
+            self.catalog_path,
+            [CatalogEntry(text.text) for text in self.text_entries],
+        )
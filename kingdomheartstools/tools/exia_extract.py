@@ -1,19 +1,19 @@
 import xml.etree.ElementTree as ET
-from pathlib import Path
 
-from polib import POEntry, POFile
+from ..common.CatalogEntry import CatalogEntry
+from ..helpers.Catalog import Catalog
 
 
 class ExiaExtract:
-    def __init__(self, input_path) -> None:
+    def __init__(self, input_path, catalog_format="po") -> None:
         with open(input_path, "r", encoding="cp932") as f:
             data = f.read().strip("ﾍ")
 
         self.tree = ET.ElementTree(ET.fromstring(data))
-        self.output_path = Path(input_path).with_suffix(".po")
+        self.output_path = Catalog.get_path(input_path, catalog_format)
 
     def extract(self: bool):
-        po = POFile()
+        entries = []
 
         root = self.tree.getroot()
         schedule = root.find("SCHEDULE")
@@ -37,6 +37,6 @@ class ExiaExtract:
                 text_movie = schedule_text_movie.find("TEXT_MOVIE")
 
                 for text in text_movie:
-                    po.append(POEntry(msgid=text.attrib["Text"], msgstr=""))
+                    entries.append(CatalogEntry(text.attrib["Text"]))
 
-        po.save(self.output_path)
+        Catalog.write(self.output_path, entries)
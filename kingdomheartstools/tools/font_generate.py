@@ -29,6 +29,17 @@ class FontGenerate:
         )
         self.output_path = Path(f"{input_folder}/out/")
 
+        # What BuildCache checks to skip an unchanged font
+        self.inputs = [Path(input_folder) / "font.json"]
+
+        for char_image in self.char_images:
+            self.inputs += [char_image, Path(char_image).with_suffix(".json")]
+
+        self.outputs = [
+            self.output_path / f"{self.font_name}{extension}"
+            for extension in [".inf", ".cod", ".tm2"]
+        ]
+
     def __save_font_meta(self):
         with open(self.output_path / f"{self.font_name}.inf", "wb") as f:
             f.write(int.to_bytes(len(self.char_images), 2, "little"))
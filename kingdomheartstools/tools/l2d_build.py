@@ -27,6 +27,10 @@ class L2DBuild:
         self.input_folder = Path(input_folder)
         self.original_file_path = original_file_path
 
+        # The original file is patched in place, so it is the output
+        self.inputs = self.images
+        self.outputs = [original_file_path]
+
     def build(self):
         self.l2d = open(self.original_file_path, "rb+")
         self.__read_header()